@@ -0,0 +1 @@
+"""Resident inference worker for the strawberry disease detection API."""
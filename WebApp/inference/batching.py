@@ -0,0 +1,96 @@
+"""Dynamic micro-batching of single-image calls from concurrent requests."""
+import queue
+import threading
+import time
+from typing import Callable, List
+
+
+class _Pending:
+    def __init__(self, source, kwargs):
+        self.source = source
+        self.kwargs = kwargs
+        self.deadline = 0.0
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+def _kwargs_key(kwargs) -> tuple:
+    return tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+
+
+class MicroBatcher:
+    """Collect images arriving within `window_ms` into one batched model call.
+
+    `run_batch(images, **kwargs)` must return one result per image. A request
+    never waits longer than its own window: the batch is flushed when the
+    oldest queued request reaches its deadline or `max_batch` is reached.
+    Requests with different call kwargs (e.g. `conf`) are batched separately.
+    The collector thread exits after `idle_s` without work and is restarted on
+    the next submit, so evicted models don't leave threads behind.
+    """
+
+    def __init__(self, run_batch: Callable, window_ms: float, max_batch: int, idle_s: float = 30.0):
+        self.run_batch = run_batch
+        self.window_s = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.idle_s = idle_s
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, source, kwargs) -> list:
+        pending = _Pending(source, kwargs)
+        pending.deadline = time.monotonic() + self.window_s
+        self._queue.put(pending)
+        self._ensure_thread()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return [pending.result]
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._collect, daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> None:
+        while True:
+            try:
+                first = self._queue.get(timeout=self.idle_s)
+            except queue.Empty:
+                with self._lock:
+                    # Re-check under the lock so a submit racing with the exit isn't stranded
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+
+            batch = [first]
+            while len(batch) < self.max_batch:
+                timeout = first.deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch: List[_Pending]) -> None:
+        groups = {}
+        for pending in batch:
+            groups.setdefault(_kwargs_key(pending.kwargs), []).append(pending)
+
+        for group in groups.values():
+            try:
+                results = self.run_batch([p.source for p in group], **group[0].kwargs)
+                for pending, result in zip(group, results):
+                    pending.result = result
+            except Exception as e:
+                for pending in group:
+                    pending.error = e
+            finally:
+                for pending in group:
+                    pending.done.set()
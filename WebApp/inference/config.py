@@ -0,0 +1,111 @@
+"""Shared paths and defaults for the inference worker."""
+import os
+
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(WEBAPP_DIR, "models")
+PUBLIC_DIR = os.path.join(WEBAPP_DIR, "public")
+INASTEK_DIR = os.path.join(WEBAPP_DIR, "..", "model_training", "test_dataset_inastek")
+
+# Same keys as the `modelPaths` dicts in the API routes
+MODEL_PATHS = {
+    "strawberry_tuned": os.path.join(MODELS_DIR, "strawberry_tuned.pt"),
+    "strawberry_tuned_best": os.path.join(MODELS_DIR, "strawberry_tuned_best.pt"),
+    "strawberry_part_detection": os.path.join(MODELS_DIR, "strawberry_part_detection.pt"),
+    "leafblight": os.path.join(MODELS_DIR, "leafblight.pt"),
+    "best_strawberry_disease_model": os.path.join(MODELS_DIR, "best_strawberry_disease_model.pt"),
+    "best": os.path.join(MODELS_DIR, "best.pt"),
+    "best_model": os.path.join(MODELS_DIR, "best_model.pt"),
+}
+
+# Stage-1 detectors (leaf / fruit / flower); the other models detect diseases
+PART_MODELS = ("strawberry_tuned", "strawberry_tuned_best", "strawberry_part_detection")
+
+# Reduced-precision execution per registry key: "fp32", "int8" (quantized
+# ONNX Runtime model) or "bf16" (torch autocast on CPUs that support it).
+# Reduced precision is only used once the model passed its accuracy gate, see
+# precision.py. Override with INFERENCE_PRECISION="strawberry_tuned=int8,leafblight=bf16".
+MODEL_PRECISION = {name: "fp32" for name in MODEL_PATHS}
+MODEL_PRECISION.update(
+    item.split("=", 1) for item in os.environ.get("INFERENCE_PRECISION", "").split(",") if item
+)
+
+# Largest drop in Inastek detection rate a reduced-precision model may show
+PRECISION_GATE_MARGIN = float(os.environ.get("INFERENCE_PRECISION_GATE_MARGIN", "0.05"))
+
+CONF_THRESH = 0.1
+
+# "torch" runs the .pt files through ultralytics; "onnx" exports them once and
+# runs them with ONNX Runtime on CPU (0 threads = let ONNX Runtime decide)
+BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+ORT_INTRA_OP_THREADS = int(os.environ.get("INFERENCE_ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.environ.get("INFERENCE_ORT_INTER_OP_THREADS", "0"))
+
+# Maximum number of part crops sent through the disease model in one call
+STAGE2_BATCH_SIZE = int(os.environ.get("INFERENCE_STAGE2_BATCH_SIZE", "16"))
+
+# Part-first routing: stage-1 part class (lower case) -> disease model key for its
+# crops, or "none" to skip them; unlisted classes use the requested disease model.
+# e.g. INFERENCE_PART_ROUTES="leaf=leafblight,flower=none"
+PART_ROUTES = dict(
+    item.lower().split("=", 1) for item in os.environ.get("INFERENCE_PART_ROUTES", "").split(",") if item
+)
+# Parts smaller than this many pixels, and all but the MAX_CROPS most confident
+# parts of an image, skip the disease model (0 = no limit)
+MIN_CROP_AREA = int(os.environ.get("INFERENCE_MIN_CROP_AREA", "0"))
+MAX_CROPS = int(os.environ.get("INFERENCE_MAX_CROPS", "0"))
+
+# Overlapping part boxes of the same class bound for the same disease model are
+# merged into one stage-2 region when their IoU, or the share of the smaller box
+# inside the larger one, reaches these values (0 disables a test, both 0 = no
+# merging). Off until the merged scores are checked against the Inastek sheet;
+# 0.7 and 0.9 are the values to try
+PART_MERGE_IOU = float(os.environ.get("INFERENCE_PART_MERGE_IOU", "0"))
+PART_MERGE_CONTAINMENT = float(os.environ.get("INFERENCE_PART_MERGE_CONTAINMENT", "0"))
+
+# Sliced inference of single images per registry key, as "<tile size>[:<overlap>[:noframe]]";
+# "noframe" drops the extra full-frame pass. Off unless configured, e.g.
+# INFERENCE_TILING="strawberry_tuned=1024:0.2,best_model=1280:0.25"
+MODEL_TILING = dict(
+    item.split("=", 1) for item in os.environ.get("INFERENCE_TILING", "").split(",") if item
+)
+# IoU above which detections from overlapping tiles are merged
+TILE_NMS_IOU = float(os.environ.get("INFERENCE_TILE_NMS_IOU", "0.5"))
+
+# Single-image calls arriving within this window are run as one batch (0 = disabled)
+BATCH_WINDOW_MS = float(os.environ.get("INFERENCE_BATCH_WINDOW_MS", "10"))
+MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "8"))
+
+# RAM budget for resident models; least-recently-used ones are evicted past it (0 = unlimited)
+MODEL_CACHE_MB = float(os.environ.get("INFERENCE_MODEL_CACHE_MB", "0"))
+
+# Every model load is warmed up with one inference on a blank square of this side
+# (the input size the models letterbox to, 0 = no warm-up); resident models whose
+# weight file changes are reloaded and swapped in, checked every MODEL_RELOAD_S (0 = never)
+WARMUP_SIZE = int(os.environ.get("INFERENCE_WARMUP_SIZE", "640"))
+MODEL_RELOAD_S = float(os.environ.get("INFERENCE_MODEL_RELOAD_S", "5"))
+
+# Content-addressed cache of prediction results and their artifacts (0 = disabled)
+RESULT_CACHE_DIR = os.environ.get("INFERENCE_RESULT_CACHE_DIR", os.path.join(WEBAPP_DIR, ".cache", "results"))
+RESULT_CACHE_MB = float(os.environ.get("INFERENCE_RESULT_CACHE_MB", "512"))
+
+# Boxes-only responses: detections are kept here and the annotated image and
+# crops are drawn on first request of their URLs (served under RENDER_URL_PREFIX)
+RENDER_DIR = os.environ.get("INFERENCE_RENDER_DIR", os.path.join(WEBAPP_DIR, ".cache", "renders"))
+RENDER_CACHE_MB = float(os.environ.get("INFERENCE_RENDER_CACHE_MB", "256"))
+# Pixels of images sent without a file, kept in memory until they are drawn
+RENDER_SOURCE_MB = float(os.environ.get("INFERENCE_RENDER_SOURCE_MB", "256"))
+RENDER_URL_PREFIX = "/api/render"
+
+# Multi-image jobs: queued images and their results live here until they are
+# JOB_RETENTION_HOURS old (0 = kept forever); JOB_WORKERS images run at once,
+# by default enough to fill one micro-batch
+JOB_DIR = os.environ.get("INFERENCE_JOB_DIR", os.path.join(WEBAPP_DIR, ".cache", "jobs"))
+JOB_WORKERS = int(os.environ.get("INFERENCE_JOB_WORKERS", str(MAX_BATCH_SIZE)))
+JOB_RETENTION_HOURS = float(os.environ.get("INFERENCE_JOB_RETENTION_HOURS", "72"))
+
+# Pre-forked workers (prefork.py) and the torch intra-op threads of each (0 = cores / workers)
+PREFORK_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+PREFORK_THREADS = int(os.environ.get("INFERENCE_THREADS_PER_WORKER", "0"))
+
+HOST = os.environ.get("INFERENCE_HOST", "127.0.0.1")
+PORT = int(os.environ.get("INFERENCE_PORT", "8001"))
@@ -0,0 +1,52 @@
+"""Access to the Inastek test images used to evaluate the models."""
+import os
+import re
+from typing import Callable, Dict, List, Tuple
+
+from .config import INASTEK_DIR
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def inastek_images(root: str = INASTEK_DIR) -> List[Tuple[str, str]]:
+    """Return (disease folder, image path) pairs in a stable order.
+
+    Output folders (`<disease>_output`) written by the evaluation are skipped.
+    """
+    images = []
+    for disease in sorted(os.listdir(root)):
+        folder = os.path.join(root, disease)
+        if not os.path.isdir(folder) or disease.endswith("_output"):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((disease, os.path.join(folder, name)))
+    return images
+
+
+def normalise_label(label: str) -> str:
+    return re.sub(r"[^a-z]", "", label.lower())
+
+
+def is_detected(predictions: List[Dict], disease: str) -> bool:
+    """Whether any secondary detection names the image's disease folder.
+
+    Labels are compared ignoring case, spaces and punctuation, so the folder
+    "Angular Leaf Spot" matches a class named "Angular Leafspot".
+    """
+    target = normalise_label(disease)
+    return any(normalise_label(detection["disease"]) == target
+               for prediction in predictions
+               for detection in prediction["secondary_detections"])
+
+
+def success_rates(predict: Callable[[str], List[Dict]],
+                  images: List[Tuple[str, str]] = None) -> Dict[str, Tuple[int, int]]:
+    """Per-disease (successful images, total images) for a prediction function."""
+    if images is None:
+        images = inastek_images()
+    rates: Dict[str, Tuple[int, int]] = {}
+    for disease, image_path in images:
+        hits, total = rates.get(disease, (0, 0))
+        rates[disease] = (hits + int(is_detected(predict(image_path), disease)), total + 1)
+    return rates
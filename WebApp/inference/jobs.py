@@ -0,0 +1,295 @@
+"""On-disk queue of multi-image prediction jobs.
+
+A job is a directory `root/<job id>/` holding `job.json` (parameters and
+per-image status), the submitted images under `images/` and the outputs
+under `results/`. A pool of threads works through the queued images; their
+single-image model calls land in the same micro-batches, so the images of a
+job are batched together. Every state change is written to `job.json` before
+it is reported, so a restarted worker picks up unfinished images where it
+left off.
+
+Clients drop the images into `root/incoming/` and submit their paths; only
+files from there are taken into a job.
+
+Several processes can share one root (see prefork.py): exactly one of them
+is the owner that runs the images and picks up jobs submitted by the others,
+which answer status requests from `job.json`.
+"""
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from typing import Dict, Iterator, List, Optional
+
+from .config import CONF_THRESH, JOB_DIR, JOB_RETENTION_HOURS, JOB_WORKERS, MAX_CROPS, MIN_CROP_AREA
+from .predict import predict_disease
+
+_JOB_ID_LENGTH = 32
+_DONE = ("done", "failed")
+# How often a shared queue looks for jobs and changes made by other processes
+_POLL_S = 1.0
+# How often the owner deletes jobs past the retention period
+_EXPIRE_S = 60.0
+
+
+class JobQueue:
+    """Jobs under `root`, run by `workers` threads through the models of `registry`.
+
+    Each thread runs one image at a time, so `workers` bounds how many images
+    of the queue meet in one micro-batch (see MAX_BATCH_SIZE).
+
+    With `shared`, other processes use the same root; a queue that is not
+    the `owner` only stores submitted jobs and reads their status from disk.
+    """
+
+    def __init__(self, registry, result_cache=None, root: str = JOB_DIR, workers: int = JOB_WORKERS,
+                 retention_hours: float = JOB_RETENTION_HOURS, owner: bool = True,
+                 shared: bool = False):
+        self.registry = registry
+        self.result_cache = result_cache
+        self.root = root
+        self.incoming = os.path.join(root, "incoming")
+        self.retention_s = retention_hours * 3600
+        self.owner = owner
+        self.shared = shared
+        self._pending: "queue.Queue[tuple]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._version = 0
+        self._jobs: Dict[str, Dict] = {}
+        os.makedirs(self.incoming, exist_ok=True)
+        if not owner:
+            return
+        self._expire()
+        self._resume()
+        for _ in range(max(1, workers)):
+            threading.Thread(target=self._work, daemon=True).start()
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _job_dir(self, job_id: str) -> str:
+        if len(job_id) != _JOB_ID_LENGTH or not all(c in "0123456789abcdef" for c in job_id):
+            raise ValueError(f"Invalid job id: {job_id}")
+        return os.path.join(self.root, job_id)
+
+    def _write(self, job: Dict) -> None:
+        job_dir = self._job_dir(job["id"])
+        tmp_path = os.path.join(job_dir, f".job.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, os.path.join(job_dir, "job.json"))
+
+    def _load(self, job_id: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self._job_dir(job_id), "job.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _resume(self) -> None:
+        """Load every job on disk not known yet and queue the images that never finished."""
+        for job_id in sorted(os.listdir(self.root)):
+            if job_id in self._jobs:
+                continue
+            job = self._load(job_id)
+            if job is None:
+                continue
+            self._jobs[job_id] = job
+            for index, image in enumerate(job["images"]):
+                if image["status"] not in _DONE:
+                    image["status"] = "queued"
+                    self._pending.put((job_id, index))
+
+    def _watch(self) -> None:
+        expired_at = time.monotonic()
+        while True:
+            time.sleep(_POLL_S)
+            if self.shared:
+                # Jobs submitted through other processes only exist on disk
+                with self._lock:
+                    self._resume()
+            # Old jobs go even when no new ones are submitted
+            if time.monotonic() - expired_at >= _EXPIRE_S:
+                self._expire()
+                expired_at = time.monotonic()
+
+    def _expire(self) -> None:
+        """Drop jobs older than the retention period, finished or not."""
+        if self.retention_s <= 0:
+            return
+        cutoff = time.time() - self.retention_s
+        for job_id in os.listdir(self.root):
+            job_dir = os.path.join(self.root, job_id)
+            if job_dir != self.incoming and os.path.getmtime(job_dir) < cutoff:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                with self._lock:
+                    self._jobs.pop(job_id, None)
+
+    def submit(self, image_paths: List[str], names: List[str], detection_method: str,
+               part_model: Optional[str], disease_model: str,
+               conf_thresh: float = CONF_THRESH) -> Dict:
+        """Move the images into a new job and queue them; returns the job's status."""
+        if not image_paths:
+            raise ValueError("A job needs at least one image")
+        for key in (part_model, disease_model):
+            if key is not None and key not in self.registry.model_paths:
+                raise ValueError(f"Unknown model: {key}")
+        if detection_method == "part-first" and part_model is None:
+            raise ValueError("part-first jobs need a part_model")
+        incoming = os.path.realpath(self.incoming)
+        for path in image_paths:
+            if os.path.dirname(os.path.realpath(path)) != incoming:
+                raise ValueError(f"Job images must be placed in {self.incoming}")
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Image not found: {path}")
+
+        job_id = uuid.uuid4().hex
+        images_dir = os.path.join(self._job_dir(job_id), "images")
+        os.makedirs(images_dir)
+        images = []
+        for index, (path, name) in enumerate(zip(image_paths, names)):
+            # Stored under a safe, unique name; the client's file name is kept for the bundle
+            stored = f"{index:04d}{os.path.splitext(path)[1].lower() or '.jpg'}"
+            shutil.move(path, os.path.join(images_dir, stored))
+            images.append({"name": os.path.basename(name) or stored, "file": stored,
+                           "status": "queued", "predictions": None, "error": None})
+
+        job = {
+            "id": job_id,
+            "created": time.time(),
+            "detection_method": detection_method,
+            "part_model": part_model if detection_method == "part-first" else None,
+            "disease_model": disease_model,
+            "conf_thresh": conf_thresh,
+            "images": images,
+        }
+        if not self.owner:
+            # The owner finds the job on disk
+            self._write(job)
+            return self.status(job_id)
+        self._expire()
+        with self._lock:
+            self._write(job)
+            self._jobs[job_id] = job
+        for index in range(len(images)):
+            self._pending.put((job_id, index))
+        return self.status(job_id)
+
+    def status(self, job_id: str, with_predictions: bool = True) -> Dict:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None and self.shared:
+                job = self._load(job_id)
+            if job is None:
+                raise KeyError(f"Unknown job: {job_id}")
+            counts = {state: 0 for state in ("queued", "running", "done", "failed")}
+            for image in job["images"]:
+                counts[image["status"]] += 1
+            finished = counts["done"] + counts["failed"]
+            return {
+                "id": job_id,
+                "state": "done" if finished == len(job["images"]) else "running",
+                "total": len(job["images"]),
+                **counts,
+                "images": [{key: value for key, value in image.items()
+                            if with_predictions or key != "predictions"}
+                           for image in job["images"]],
+            }
+
+    def events(self, job_id: str, timeout_s: float = 15.0) -> Iterator[Dict]:
+        """Yield the job's status (without predictions) on every change until it is done.
+
+        A status is also repeated every `timeout_s` so idle connections stay alive.
+        """
+        seen, last, sent_at = -1, None, 0.0
+        while True:
+            with self._changed:
+                if self._version == seen:
+                    # Changes made by the owner process are only seen by polling
+                    self._changed.wait(timeout_s if self.owner else _POLL_S)
+                seen = self._version
+            status = self.status(job_id, with_predictions=False)
+            if status != last or time.monotonic() - sent_at >= timeout_s:
+                yield status
+                last, sent_at = status, time.monotonic()
+            if status["state"] == "done":
+                return
+
+    def bundle(self, job_id: str) -> str:
+        """Path of a zip with predictions.json, annotated images and crops of a finished job."""
+        status = self.status(job_id)
+        if status["state"] != "done":
+            raise ValueError(f"Job {job_id} is still running")
+        job_dir = self._job_dir(job_id)
+        bundle_path = os.path.join(job_dir, "bundle.zip")
+        if os.path.exists(bundle_path):
+            return bundle_path
+
+        tmp_path = os.path.join(job_dir, f".bundle.{uuid.uuid4().hex}.tmp")
+        results_dir = os.path.join(job_dir, "results")
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as bundle:
+            bundle.writestr("predictions.json", json.dumps(status["images"], indent=2))
+            for dirpath, _, filenames in os.walk(results_dir):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    bundle.write(path, os.path.relpath(path, results_dir))
+        os.replace(tmp_path, bundle_path)
+        return bundle_path
+
+    def _update(self, job_id: str, index: int, **changes) -> None:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return  # expired in the meantime
+            job["images"][index].update(changes)
+            self._write(job)
+            self._version += 1
+            self._changed.notify_all()
+
+    def _work(self) -> None:
+        while True:
+            job_id, index = self._pending.get()
+            try:
+                self._run(job_id, index)
+            except Exception as e:
+                self._update(job_id, index, status="failed", error=str(e))
+
+    def _run(self, job_id: str, index: int) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return  # expired while queued
+        self._update(job_id, index, status="running")
+
+        image = job["images"][index]
+        job_dir = self._job_dir(job_id)
+        stem = os.path.splitext(image["file"])[0]
+        results_dir = os.path.join(job_dir, "results")
+        os.makedirs(results_dir, exist_ok=True)
+        part_first = job["detection_method"] == "part-first"
+        result = predict_disease(
+            os.path.join(job_dir, "images", image["file"]),
+            job["detection_method"],
+            self.registry.get(job["part_model"]) if part_first else None,
+            self.registry.get(job["disease_model"]),
+            conf_thresh=job["conf_thresh"],
+            annotated_path=os.path.join(results_dir, f"{stem}.jpg"),
+            crop_folder=os.path.join(results_dir, "crops", stem),
+            result_cache=self.result_cache,
+            routes=self.registry.part_routes() if part_first else None,
+            min_crop_area=MIN_CROP_AREA,
+            max_crops=MAX_CROPS,
+        )
+        if "error" in result:
+            return self._update(job_id, index, status="failed", error=result["error"])
+
+        # Crop URLs point inside the bundle rather than at public/
+        predictions = result["predictions"]
+        for prediction in predictions:
+            if prediction["crop_url"]:
+                prediction["crop_url"] = f"crops/{stem}/{os.path.basename(prediction['crop_url'])}"
+        self._update(job_id, index, status="done", predictions=predictions,
+                     annotated=f"{stem}.jpg")
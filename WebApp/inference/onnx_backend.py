@@ -0,0 +1,103 @@
+"""ONNX Runtime CPU backend that stands in for `ultralytics.YOLO` at inference time."""
+import ast
+import os
+from typing import Dict, List
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+import torch
+from ultralytics import YOLO
+from ultralytics.engine.results import Results
+from ultralytics.utils import ops
+
+from .config import ORT_INTER_OP_THREADS, ORT_INTRA_OP_THREADS
+
+
+def export_onnx(pt_path: str, imgsz: int = 640) -> str:
+    """Export a `.pt` file to ONNX once and cache it next to the weights.
+
+    The export is redone when the `.pt` file is newer than the cached `.onnx`.
+    """
+    onnx_path = os.path.splitext(pt_path)[0] + ".onnx"
+    if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(pt_path):
+        return onnx_path
+    # dynamic axes so stage-2 crops and micro-batches can share one session call
+    exported = YOLO(pt_path).export(format="onnx", imgsz=imgsz, dynamic=True, verbose=False)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+
+def letterbox(image: np.ndarray, new_shape=(640, 640)) -> np.ndarray:
+    """Resize and pad to `new_shape` keeping aspect ratio, as ultralytics' LetterBox does."""
+    h, w = image.shape[:2]
+    r = min(new_shape[0] / h, new_shape[1] / w)
+    new_unpad = (int(round(w * r)), int(round(h * r)))
+    dw, dh = (new_shape[1] - new_unpad[0]) / 2, (new_shape[0] - new_unpad[1]) / 2
+
+    if (w, h) != new_unpad:
+        image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                              value=(114, 114, 114))
+
+
+def preprocess(images: List[np.ndarray], imgsz) -> np.ndarray:
+    """Letterbox BGR images into a normalised float32 RGB NCHW batch."""
+    batch = np.stack([letterbox(image, imgsz) for image in images])
+    batch = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW
+    return batch.astype(np.float32) / 255.0
+
+
+class OnnxYOLO:
+    """Run an exported YOLO detector with ONNX Runtime and return ultralytics `Results`.
+
+    Pre- and post-processing mirror the ultralytics predictor (letterbox,
+    class-aware NMS, rescaling to the original image), so `predict_disease`
+    sees the same boxes, `names` and `plot()` as with the PyTorch backend.
+    """
+
+    def __init__(self, onnx_path: str, intra_op_threads: int = ORT_INTRA_OP_THREADS,
+                 inter_op_threads: int = ORT_INTER_OP_THREADS):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        self.path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names: Dict[int, str] = ast.literal_eval(metadata["names"])
+        self.imgsz = tuple(ast.literal_eval(metadata.get("imgsz", "[640, 640]")))
+
+    @property
+    def nbytes(self) -> int:
+        return os.path.getsize(self.path)
+
+    def __call__(self, source, conf: float = 0.25, iou: float = 0.7, max_det: int = 300,
+                 verbose: bool = False, **kwargs) -> List[Results]:
+        images = source if isinstance(source, list) else [source]
+        if not images:
+            return []
+
+        batch = preprocess(images, self.imgsz)
+        output = self.session.run(None, {self.input_name: batch})[0]
+        detections = ops.non_max_suppression(
+            torch.from_numpy(output), conf_thres=conf, iou_thres=iou, max_det=max_det,
+        )
+
+        results = []
+        for image, det in zip(images, detections):
+            det[:, :4] = ops.scale_boxes(batch.shape[2:], det[:, :4], image.shape)
+            results.append(Results(image, path="", names=self.names, boxes=det))
+        return results
+
+
+def load_onnx_model(pt_path: str) -> OnnxYOLO:
+    return OnnxYOLO(export_onnx(pt_path))
@@ -0,0 +1,102 @@
+"""Check that the ONNX Runtime backend reproduces the PyTorch backend's detections.
+
+Run from the WebApp directory; exits non-zero if any model diverges:
+
+    python -m inference.parity --models strawberry_tuned leafblight --limit 20
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from .config import CONF_THRESH, MODEL_PATHS
+from .dataset import inastek_images
+from .onnx_backend import load_onnx_model
+
+
+def _iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def compare_detections(expected: np.ndarray, actual: np.ndarray, conf_thresh: float,
+                       iou_tol: float, conf_tol: float) -> List[str]:
+    """Match (x1, y1, x2, y2, conf, cls) rows one-to-one and describe every divergence.
+
+    Boxes that only one backend found are tolerated when their confidence is
+    within `conf_tol` of the threshold, since they may legitimately fall on
+    either side of it.
+    """
+    problems = []
+    unmatched = list(range(len(actual)))
+    for row in expected[np.argsort(-expected[:, 4])]:
+        candidates = [i for i in unmatched if int(actual[i, 5]) == int(row[5])]
+        best = None
+        if candidates:
+            ious = _iou(row[:4], actual[candidates, :4])
+            best = candidates[int(np.argmax(ious))]
+            best_iou = float(ious.max())
+        if best is None or best_iou < iou_tol:
+            if row[4] - conf_thresh > conf_tol:
+                problems.append(f"missing class {int(row[5])} box at conf {row[4]:.3f}")
+            continue
+        unmatched.remove(best)
+        if abs(actual[best, 4] - row[4]) > conf_tol:
+            problems.append(f"class {int(row[5])} conf {row[4]:.3f} vs {actual[best, 4]:.3f}")
+    for i in unmatched:
+        if actual[i, 4] - conf_thresh > conf_tol:
+            problems.append(f"extra class {int(actual[i, 5])} box at conf {actual[i, 4]:.3f}")
+    return problems
+
+
+def check_model(name: str, image_paths: List[str], conf_thresh: float,
+                iou_tol: float, conf_tol: float) -> Dict:
+    torch_model = YOLO(MODEL_PATHS[name])
+    onnx_model = load_onnx_model(MODEL_PATHS[name])
+    if onnx_model.names != torch_model.names:
+        return {"model": name, "passed": False, "failures": {"names": "class names differ"}}
+
+    failures = {}
+    for image_path in image_paths:
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        expected = torch_model(image, conf=conf_thresh, verbose=False)[0].boxes.data.cpu().numpy()
+        actual = onnx_model(image, conf=conf_thresh)[0].boxes.data.cpu().numpy()
+        problems = compare_detections(expected, actual, conf_thresh, iou_tol, conf_tol)
+        if problems:
+            failures[image_path] = problems
+    return {"model": name, "images": len(image_paths), "passed": not failures, "failures": failures}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="*", default=list(MODEL_PATHS))
+    parser.add_argument("--limit", type=int, default=0, help="Number of images to check (0 = all)")
+    parser.add_argument("--conf", type=float, default=CONF_THRESH)
+    parser.add_argument("--iou-tol", type=float, default=0.9,
+                        help="Minimum IoU between matched boxes")
+    parser.add_argument("--conf-tol", type=float, default=0.02,
+                        help="Maximum confidence difference between matched boxes")
+    args = parser.parse_args()
+
+    image_paths = [path for _, path in inastek_images()]
+    if args.limit:
+        image_paths = image_paths[:args.limit]
+
+    passed = True
+    for name in args.models:
+        report = check_model(name, image_paths, args.conf, args.iou_tol, args.conf_tol)
+        print(json.dumps(report), flush=True)
+        passed = passed and report["passed"]
+    sys.exit(0 if passed else 1)
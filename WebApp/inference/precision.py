@@ -0,0 +1,256 @@
+"""INT8 / bfloat16 reduced-precision models behind an Inastek accuracy gate.
+
+Run from the WebApp directory:
+
+    # INT8: quantize with a calibration sample of the training images
+    python -m inference.precision quantize strawberry_tuned --calibration-dir /data/strawberry-2/train/images
+    # Compare against fp32 on the Inastek test set and record the verdict
+    python -m inference.precision gate strawberry_tuned --precision int8
+
+A reduced-precision model is only used by the registry once its gate report
+(`models/<name>.<precision>.gate.json`) approves the current weight file.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+import cv2
+import torch
+from ultralytics import YOLO
+
+from .config import MODEL_PATHS, PART_MODELS, PRECISION_GATE_MARGIN
+from .dataset import IMAGE_EXTENSIONS, success_rates
+from .predict import predict_disease
+from .registry import ModelHandle, load_model
+
+PRECISIONS = ("int8", "bf16")
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cpu_supports_bf16() -> bool:
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def int8_path(pt_path: str) -> str:
+    return os.path.splitext(pt_path)[0] + ".int8.onnx"
+
+
+def gate_path(pt_path: str, precision: str) -> str:
+    return os.path.splitext(pt_path)[0] + f".{precision}.gate.json"
+
+
+def gate_passed(pt_path: str, precision: str) -> bool:
+    """Whether the gate approved this precision for the weight file as it is now."""
+    try:
+        with open(gate_path(pt_path, precision)) as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return bool(report.get("approved")) and report.get("model_sha256") == _sha256(pt_path)
+
+
+def quantize_int8(pt_path: str, calibration_images: List[str]) -> str:
+    """Statically quantize the ONNX export of `pt_path` to INT8 (QDQ, per-channel weights)."""
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    from .onnx_backend import OnnxYOLO, export_onnx, preprocess
+
+    fp32_path = export_onnx(pt_path)
+    reference = OnnxYOLO(fp32_path)
+
+    class ImageReader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(calibration_images)
+
+        def get_next(self) -> Optional[Dict]:
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {reference.input_name: preprocess([image], reference.imgsz)}
+            return None
+
+    output_path = int8_path(pt_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = os.path.join(tmp, "prepared.onnx")
+        quant_pre_process(fp32_path, prepared)
+        quantize_static(prepared, output_path, ImageReader(),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+    # Keep the class names and input size that OnnxYOLO reads from the metadata
+    source, quantized = onnx.load(fp32_path), onnx.load(output_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, output_path)
+    return output_path
+
+
+def _cast_float(output):
+    if isinstance(output, torch.Tensor):
+        return output.float()
+    if isinstance(output, (list, tuple)):
+        return type(output)(_cast_float(o) for o in output)
+    return output
+
+
+def load_bf16(pt_path: str) -> YOLO:
+    """Load a YOLO model whose forward pass runs under CPU bfloat16 autocast.
+
+    Only the network runs in bf16; its outputs are cast back to float32 so
+    NMS and box scaling behave as usual.
+    """
+    model = YOLO(pt_path)
+    module = model.model
+    forward = module.forward
+
+    def bf16_forward(*args, **kwargs):
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            return _cast_float(forward(*args, **kwargs))
+
+    module.forward = bf16_forward
+    return model
+
+
+def load_reduced_precision(pt_path: str, precision: str, require_gate: bool = True):
+    """Load `pt_path` at `precision`, or return None if it may not be used here."""
+    if require_gate and not gate_passed(pt_path, precision):
+        print(f"{os.path.basename(pt_path)}: {precision} has not passed its accuracy gate, "
+              "using fp32", file=sys.stderr)
+        return None
+    if precision == "int8":
+        from .onnx_backend import OnnxYOLO
+        if not os.path.exists(int8_path(pt_path)):
+            print(f"{os.path.basename(pt_path)}: no INT8 model, run `quantize` first", file=sys.stderr)
+            return None
+        return OnnxYOLO(int8_path(pt_path))
+    if precision == "bf16":
+        if not cpu_supports_bf16():
+            print("CPU has no native bf16 support, using fp32", file=sys.stderr)
+            return None
+        return load_bf16(pt_path)
+    raise ValueError(f"Unknown precision: {precision}")
+
+
+def _rates(part_handle, disease_handle) -> Dict[str, List[int]]:
+    detection_method = "part-first" if part_handle is not None else "direct"
+    with tempfile.TemporaryDirectory() as tmp:
+        def predict(image_path):
+            result = predict_disease(
+                image_path, detection_method, part_handle, disease_handle,
+                annotated_path=os.path.join(tmp, "annotated.jpg"),
+                crop_folder=os.path.join(tmp, "crops"),
+            )
+            if "error" in result:
+                raise RuntimeError(f"{image_path}: {result['error']}")
+            return result["predictions"]
+
+        return {disease: list(rate) for disease, rate in success_rates(predict).items()}
+
+
+def run_gate(name: str, precision: str, margin: float = PRECISION_GATE_MARGIN,
+             disease_model: str = "best_strawberry_disease_model",
+             per_disease: bool = False) -> Dict:
+    """Compare Inastek detection rates at `precision` against fp32 and record the verdict.
+
+    Disease models are evaluated in direct mode; part models in part-first
+    mode with the fp32 `disease_model` behind them.
+    """
+    pt_path = MODEL_PATHS[name]
+    candidate = load_reduced_precision(pt_path, precision, require_gate=False)
+    if candidate is None:
+        raise RuntimeError(f"{precision} is not available for {name} on this machine")
+
+    baseline = ModelHandle(name, pt_path, load_model(pt_path, "torch")[0])
+    reduced = ModelHandle(name, pt_path, candidate, precision)
+    if name in PART_MODELS:
+        partner = ModelHandle(disease_model, MODEL_PATHS[disease_model],
+                              load_model(MODEL_PATHS[disease_model], "torch")[0])
+        baseline_rates = _rates(baseline, partner)
+        candidate_rates = _rates(reduced, partner)
+    else:
+        baseline_rates = _rates(None, baseline)
+        candidate_rates = _rates(None, reduced)
+
+    def rate(hits_total):
+        hits, total = hits_total
+        return hits / total if total else 0.0
+
+    def overall(rates):
+        return rate([sum(r[0] for r in rates.values()), sum(r[1] for r in rates.values())])
+
+    drops = {disease: rate(baseline_rates[disease]) - rate(candidate_rates[disease])
+             for disease in baseline_rates}
+    overall_drop = overall(baseline_rates) - overall(candidate_rates)
+    worst = max([overall_drop] + (list(drops.values()) if per_disease else []))
+
+    report = {
+        "model": name,
+        "precision": precision,
+        "model_sha256": _sha256(pt_path),
+        "margin": margin,
+        "per_disease": per_disease,
+        "baseline": baseline_rates,
+        "candidate": candidate_rates,
+        "overall_drop": round(overall_drop, 4),
+        "approved": worst <= margin,
+    }
+    with open(gate_path(pt_path, precision), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def _calibration_sample(directory: str, size: int, seed: int = 0) -> List[str]:
+    paths = sorted(
+        os.path.join(dirpath, filename)
+        for dirpath, _, filenames in os.walk(directory)
+        for filename in filenames if filename.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    random.Random(seed).shuffle(paths)
+    return paths[:size]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    quantize = commands.add_parser("quantize", help="Build the INT8 model for a registry key")
+    quantize.add_argument("model", choices=list(MODEL_PATHS))
+    quantize.add_argument("--calibration-dir", required=True,
+                          help="Training images to calibrate activation ranges on")
+    quantize.add_argument("--calibration-size", type=int, default=200)
+
+    gate = commands.add_parser("gate", help="Evaluate a reduced-precision model and record the verdict")
+    gate.add_argument("model", choices=list(MODEL_PATHS))
+    gate.add_argument("--precision", choices=PRECISIONS, required=True)
+    gate.add_argument("--margin", type=float, default=PRECISION_GATE_MARGIN)
+    gate.add_argument("--per-disease", action="store_true",
+                      help="Apply the margin to every disease, not only the overall rate")
+
+    args = parser.parse_args()
+    if args.command == "quantize":
+        images = _calibration_sample(args.calibration_dir, args.calibration_size)
+        print(quantize_int8(MODEL_PATHS[args.model], images))
+    else:
+        report = run_gate(args.model, args.precision, args.margin, per_disease=args.per_disease)
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["approved"] else 1)
@@ -0,0 +1,392 @@
+"""Part-first and direct disease detection on a single image."""
+import os
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from .config import (CONF_THRESH, PART_MERGE_CONTAINMENT, PART_MERGE_IOU, PUBLIC_DIR,
+                     STAGE2_BATCH_SIZE)
+from .regions import merge_parts, part_result
+from .timing import timed
+
+
+def public_url(filepath: str) -> str:
+    rel_path = os.path.relpath(filepath, PUBLIC_DIR)
+    return "/" + rel_path.replace(os.sep, "/")
+
+
+def result_arrays(result, conf_thresh: float = CONF_THRESH,
+                  clip_shape: Tuple[int, int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Copy a result's boxes to the host in one transfer and filter them.
+
+    Returns integer `xyxy`, `conf` and `cls` arrays for the boxes at or above
+    `conf_thresh`. With `clip_shape` (h, w) the boxes are clipped to the image
+    and boxes left with no area are dropped.
+    """
+    data = result.boxes.data.cpu().numpy()  # x1, y1, x2, y2, [track id,] conf, cls
+    data = data[data[:, -2] >= conf_thresh]
+    xyxy = data[:, :4].astype(int)
+    conf = data[:, -2]
+    cls = data[:, -1].astype(int)
+
+    if clip_shape is not None:
+        h, w = clip_shape
+        xyxy[:, 0] = np.maximum(xyxy[:, 0], 0)
+        xyxy[:, 1] = np.maximum(xyxy[:, 1], 0)
+        xyxy[:, 2] = np.minimum(xyxy[:, 2], w)
+        xyxy[:, 3] = np.minimum(xyxy[:, 3], h)
+        keep = (xyxy[:, 2] > xyxy[:, 0]) & (xyxy[:, 3] > xyxy[:, 1])
+        xyxy, conf, cls = xyxy[keep], conf[keep], cls[keep]
+    return xyxy, conf, cls
+
+
+def detect_parts(part_model, image: np.ndarray, conf_thresh: float = CONF_THRESH) -> List[Dict]:
+    """Run stage 1 and return the part boxes, clipped to the image."""
+    parts = []
+    for result in part_model(image, conf=conf_thresh):
+        xyxy, conf, cls = result_arrays(result, conf_thresh, clip_shape=image.shape[:2])
+        parts.extend({
+            "bbox": bbox,
+            "class_id": class_id,
+            "confidence": confidence,
+        } for bbox, class_id, confidence in zip(xyxy.tolist(), cls.tolist(), conf.tolist()))
+    return parts
+
+
+def crop_parts(image: np.ndarray, parts: List[Dict]) -> List[np.ndarray]:
+    crops = []
+    for part in parts:
+        x1, y1, x2, y2 = part["bbox"]
+        crops.append(image[y1:y2, x1:x2].copy())
+    return crops
+
+
+def detect_crop_diseases(disease_model, crops: List[np.ndarray], conf_thresh: float = CONF_THRESH,
+                         batch_size: int = STAGE2_BATCH_SIZE, on_result: Callable = None) -> list:
+    """Run stage 2 over all crops in batched calls; one result per crop, in order.
+
+    `on_result(index, result)` is called for each crop as soon as its batch is done.
+    """
+    results = []
+    for start in range(0, len(crops), batch_size):
+        batch = disease_model(crops[start:start + batch_size], conf=conf_thresh)
+        if on_result is not None:
+            for offset, result in enumerate(batch):
+                on_result(start + offset, result)
+        results.extend(batch)
+    return results
+
+
+def plan_stage2(parts: List[Dict], part_names: Dict[int, str], disease_model,
+                routes: Dict[str, object] = None, min_crop_area: int = 0,
+                max_crops: int = 0) -> list:
+    """Pick the disease model to run on each part's crop, or None to skip it.
+
+    `routes` maps a lower-case part class name to the disease model for its
+    crops (None skips the class); other classes use `disease_model`. Crops
+    under `min_crop_area` pixels are skipped, and only the `max_crops` most
+    confident remaining parts get a disease pass (0 = no limit).
+    """
+    plan = [None] * len(parts)
+    budget = max_crops or len(parts)
+    for i in sorted(range(len(parts)), key=lambda i: -parts[i]["confidence"]):
+        if budget == 0:
+            break
+        x1, y1, x2, y2 = parts[i]["bbox"]
+        if (x2 - x1) * (y2 - y1) < min_crop_area:
+            continue
+        model = disease_model
+        if routes:
+            model = routes.get(part_names[parts[i]["class_id"]].lower(), disease_model)
+        if model is not None:
+            plan[i] = model
+            budget -= 1
+    return plan
+
+
+def run_stage2(crops: List[np.ndarray], plan: list, conf_thresh: float = CONF_THRESH,
+               on_result: Callable = None) -> list:
+    """Run every crop through its planned model, batched per model; None where skipped."""
+    results = [None] * len(crops)
+    by_model = {}
+    for i, model in enumerate(plan):
+        if model is not None:
+            by_model.setdefault(id(model), (model, []))[1].append(i)
+    for model, indices in by_model.values():
+        forward = None
+        if on_result is not None:
+            def forward(k, result, indices=indices):
+                on_result(indices[k], result)
+        model_results = detect_crop_diseases(model, [crops[i] for i in indices], conf_thresh,
+                                             on_result=forward)
+        for i, result in zip(indices, model_results):
+            results[i] = result
+    return results
+
+
+def run_merged_stage2(image: np.ndarray, parts: List[Dict], crops: List[np.ndarray], plan: list,
+                      conf_thresh: float = CONF_THRESH, iou: float = PART_MERGE_IOU,
+                      containment: float = PART_MERGE_CONTAINMENT,
+                      on_result: Callable = None) -> list:
+    """Like `run_stage2`, but overlapping parts share one pass over their merged region.
+
+    `on_result(part index, result)` is called for every part of a region once
+    the region's batch is done.
+    """
+    if iou <= 0 and containment <= 0:
+        return run_stage2(crops, plan, conf_thresh, on_result)
+    regions = merge_parts(parts, plan, iou, containment)
+    results = [None] * len(parts)
+
+    def attribute(k, region_result):
+        region = regions[k]
+        for i in region["members"]:
+            results[i] = part_result(region_result, region["bbox"], parts[i]["bbox"], crops[i])
+            if on_result is not None:
+                on_result(i, results[i])
+
+    run_stage2(crop_parts(image, regions), [r["model"] for r in regions], conf_thresh, attribute)
+    return results
+
+
+def secondary_detections(result, conf_thresh: float = CONF_THRESH) -> List[Dict]:
+    """Disease detections in one crop; a crop that skipped stage 2 has none."""
+    if result is None:
+        return []
+    _, conf, cls = result_arrays(result, conf_thresh)
+    return [{
+        "disease": result.names[class_id],
+        "confidence": confidence
+    } for class_id, confidence in zip(cls.tolist(), conf.tolist())]
+
+
+def part_first_predictions(parts: List[Dict], crop_results: list, part_names: Dict[int, str],
+                           crop_urls: List[str], conf_thresh: float = CONF_THRESH) -> List[Dict]:
+    return [{
+        "primary_detection": {
+            "disease": part_names[part["class_id"]],
+            "confidence": part["confidence"],
+            "bbox": part["bbox"]
+        },
+        "secondary_detections": secondary_detections(res2, conf_thresh),
+        "crop_url": crop_url
+    } for part, res2, crop_url in zip(parts, crop_results, crop_urls)]
+
+
+def annotate_part_first(image: np.ndarray, parts: List[Dict], crops: List[np.ndarray],
+                        crop_results: list, part_names: Dict[int, str], crop_folder: str,
+                        conf_thresh: float = CONF_THRESH, timer=None) -> List[Dict]:
+    """Paste annotated crops into `image`, save them and build the predictions.
+
+    A crop result of None (stage 2 skipped) leaves the crop as it is. With a
+    `timer`, drawing and file writes are timed as "plot" and "imwrite".
+    """
+    os.makedirs(crop_folder, exist_ok=True)
+    crop_urls = []
+
+    for crop_index, (part, crop_img, res2) in enumerate(zip(parts, crops, crop_results), 1):
+        x1, y1, x2, y2 = part["bbox"]
+
+        with timed(timer, "plot"):
+            # Annotate the crop only if we have detections, otherwise keep the original
+            if secondary_detections(res2, conf_thresh):
+                annotated_crop = res2.plot(font_size=10, line_width=4)
+            else:
+                annotated_crop = crop_img
+
+            annotated_crop_resized = cv2.resize(annotated_crop, (x2 - x1, y2 - y1))
+            image[y1:y2, x1:x2] = annotated_crop_resized
+
+        crop_filepath = os.path.join(crop_folder, f"crop_{crop_index}.jpg")
+        with timed(timer, "imwrite"):
+            cv2.imwrite(crop_filepath, annotated_crop_resized)
+        crop_urls.append(public_url(crop_filepath))
+
+    return part_first_predictions(parts, crop_results, part_names, crop_urls, conf_thresh)
+
+
+def keep_confident(result, conf_thresh: float = CONF_THRESH):
+    """A copy of `result` holding only the boxes at or above `conf_thresh`."""
+    return result[result.boxes.conf >= conf_thresh]
+
+
+def direct_predictions(results: list, disease_names: Dict[int, str],
+                       conf_thresh: float = CONF_THRESH) -> List[Dict]:
+    # Collect bounding boxes without saving crops
+    predictions = []
+    for result in results:
+        xyxy, conf, cls = result_arrays(result, conf_thresh)
+        for bbox, class_id, confidence in zip(xyxy.tolist(), cls.tolist(), conf.tolist()):
+            disease_name = disease_names[class_id]
+            predictions.append({
+                "primary_detection": {
+                    "disease": disease_name,
+                    "confidence": confidence,
+                    "bbox": bbox
+                },
+                "secondary_detections": [{
+                    "disease": disease_name,
+                    "confidence": confidence
+                }],
+                "crop_url": ""
+            })
+    return predictions
+
+
+def annotate_direct(results: list, disease_names: Dict[int, str],
+                    conf_thresh: float = CONF_THRESH) -> Tuple[np.ndarray, List[Dict]]:
+    """Plot direct-mode results and build the predictions."""
+    annotated = results[0].plot(font_size=10, line_width=4)
+    return annotated, direct_predictions(results, disease_names, conf_thresh)
+
+
+def predict_disease(image_path, detection_method, part_model, disease_model,
+                    conf_thresh=CONF_THRESH, annotated_path=None, crop_folder=None,
+                    result_cache=None, render_store=None, image=None,
+                    routes=None, min_crop_area=0, max_crops=0,
+                    merge_iou=PART_MERGE_IOU, merge_containment=PART_MERGE_CONTAINMENT,
+                    on_prediction=None, timer=None):
+    """Run detection and return the JSON payload sent back to the API.
+
+    `part_model` and `disease_model` are resident model handles; `part_model`
+    is ignored in direct mode. The annotated image overwrites `image_path`
+    and crops go to `crops/<image name>/` next to it unless overridden.
+    With a `result_cache`, a previously seen image/model combination is
+    answered from the cache without running inference.
+
+    With a `render_store`, nothing is drawn or written: the payload carries
+    only the boxes, with an `annotated_url` and crop URLs that the store
+    renders when they are first requested.
+
+    An already decoded BGR `image` is used instead of reading `image_path`,
+    which may then be None; without a `render_store` an `annotated_path`
+    is needed to write the result to.
+
+    In part-first mode `routes`, `min_crop_area` and `max_crops` decide which
+    crops reach which disease model, see `plan_stage2`. Overlapping parts
+    bound for the same model share one disease pass over their merged region
+    (`merge_iou` / `merge_containment`, 0 disables each test). An image without
+    any detected part skips stage 2 and is returned as it is.
+
+    `on_prediction(index, prediction)` receives each part-first prediction as
+    soon as its crop is done, before the full payload is returned. Its
+    `crop_url` only resolves once the whole prediction has finished.
+
+    A `timing.StageTimer` passed as `timer` gets the time spent in each stage.
+    """
+    try:
+        if image is None and not os.path.exists(image_path):
+            return {"error": "Input image not found"}
+
+        if annotated_path is None:
+            annotated_path = image_path
+        if annotated_path is None and render_store is None:
+            return {"error": "An annotated_path is required for in-memory images"}
+        if crop_folder is None and annotated_path is not None:
+            base_name = os.path.splitext(os.path.basename(annotated_path))[0]
+            crop_folder = os.path.join(os.path.dirname(annotated_path), "crops", base_name)
+
+        if detection_method != "part-first":
+            part_model = None
+        # Routed disease models decide results too; their entries are purged along with the others
+        routed_models = tuple(model for model in (routes or {}).values()
+                              if model is not None and part_model is not None)
+        cache_key = None
+        with timed(timer, "cache_lookup"):
+            if result_cache is not None:
+                variant = ",".join(m.variant for m in (part_model, disease_model) if m is not None)
+                if part_model is not None and (routes or min_crop_area or max_crops):
+                    route_desc = ",".join(
+                        f"{part}={model.name}:{model.variant}:{result_cache.model_hash(model)}"
+                        if model else f"{part}=none"
+                        for part, model in sorted((routes or {}).items()))
+                    variant += f"|routes:{route_desc}|min_area:{min_crop_area}|max_crops:{max_crops}"
+                if part_model is not None and (merge_iou > 0 or merge_containment > 0):
+                    variant += f"|merge:{merge_iou}:{merge_containment}"
+                cache_key = result_cache.key(image_path, detection_method, part_model, disease_model,
+                                             conf_thresh, variant, image=image)
+                if render_store is None:
+                    cached = result_cache.get(cache_key, annotated_path, crop_folder)
+                    if cached is not None:
+                        return {"success": True, "predictions": cached}
+            if render_store is not None:
+                render_id = render_store.new_id(cache_key)
+                cached = render_store.get(render_id, image_path, image)
+                if cached is not None:
+                    return {"success": True, "predictions": cached,
+                            "annotated_url": render_store.url(render_id, "annotated.jpg")}
+
+        original_image = image
+        if image is None:
+            with timed(timer, "imread"):
+                original_image = cv2.imread(image_path)
+        if original_image is None:
+            return {"error": "Failed to load image"}
+
+        if detection_method == "part-first":
+            # First detect parts, then run the crops through their disease models in batches
+            with timed(timer, "stage1"):
+                parts = detect_parts(part_model, original_image, conf_thresh)
+                crops = crop_parts(original_image, parts)
+            plan = plan_stage2(parts, part_model.names, disease_model, routes,
+                               min_crop_area, max_crops)
+            emit = None
+            if on_prediction is not None:
+                def emit(i, result):
+                    crop_name = f"crop_{i + 1}.jpg"
+                    crop_url = (render_store.url(render_id, crop_name) if render_store is not None
+                                else public_url(os.path.join(crop_folder, crop_name)))
+                    on_prediction(i, part_first_predictions(
+                        [parts[i]], [result], part_model.names, [crop_url], conf_thresh)[0])
+                # Parts that skip stage 2 are already final
+                for i, model in enumerate(plan):
+                    if model is None:
+                        emit(i, None)
+            with timed(timer, "stage2"):
+                crop_results = run_merged_stage2(original_image, parts, crops, plan, conf_thresh,
+                                                 merge_iou, merge_containment, emit)
+        else:
+            # Direct disease detection (annotate full image at once)
+            with timed(timer, "detect"):
+                results = disease_model(original_image, conf=conf_thresh)
+
+        if render_store is not None:
+            with timed(timer, "render_save"):
+                if detection_method == "part-first":
+                    predictions = render_store.save_part_first(
+                        render_id, image_path, parts, crop_results,
+                        part_model.names, conf_thresh, image,
+                    )
+                else:
+                    predictions = render_store.save_direct(
+                        render_id, image_path, results, disease_model.names, conf_thresh, image,
+                    )
+            return {"success": True, "predictions": predictions,
+                    "annotated_url": render_store.url(render_id, "annotated.jpg")}
+
+        if detection_method == "part-first":
+            if not parts and annotated_path == image_path:
+                # Nothing to draw: the uploaded file already is the annotated image
+                predictions = []
+            else:
+                predictions = annotate_part_first(
+                    original_image, parts, crops, crop_results,
+                    part_model.names, crop_folder, conf_thresh, timer,
+                )
+                with timed(timer, "imwrite"):
+                    cv2.imwrite(annotated_path, original_image)
+        else:
+            with timed(timer, "plot"):
+                original_image, predictions = annotate_direct(results, disease_model.names, conf_thresh)
+            with timed(timer, "imwrite"):
+                cv2.imwrite(annotated_path, original_image)
+
+        if result_cache is not None:
+            with timed(timer, "cache_store"):
+                result_cache.put(cache_key, predictions, annotated_path, crop_folder,
+                                 (part_model, disease_model) + routed_models)
+        return {"success": True, "predictions": predictions}
+
+    except Exception as e:
+        return {"error": str(e)}
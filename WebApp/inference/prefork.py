@@ -0,0 +1,229 @@
+"""Pre-forked inference workers sharing the model weights copy-on-write.
+
+The parent imports torch and ultralytics, loads every weight file in
+MODEL_PATHS and runs one warm-up inference through each model, which fuses
+the layers and builds the predictor, so the workers never write to those
+pages. It then opens the listening socket and forks `--workers` HTTP
+servers; the kernel hands each connection to one of them. A worker only
+allocates the activations of its own requests, and a worker that exits is
+replaced by a new fork in milliseconds.
+
+Weight files are watched by the parent alone (MODEL_RELOAD_S). A changed
+model is reloaded and warmed up there once, then every worker finishes its
+running requests and is replaced by a fork that shares the new weights.
+Each worker gets an equal share of the result cache budget, since it only
+evicts the entries it knows of.
+
+Run from the WebApp directory:
+
+    python -m inference.prefork --workers 4 --threads-per-worker 2
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import cv2
+import torch
+
+from .config import (BATCH_WINDOW_MS, HOST, JOB_WORKERS, MODEL_RELOAD_S, PORT, PREFORK_THREADS,
+                     PREFORK_WORKERS, RENDER_CACHE_MB, RESULT_CACHE_MB)
+from .jobs import JobQueue
+from .registry import ModelRegistry
+from .render import RenderStore
+from .result_cache import ResultCache
+from .server import InferenceHandler
+from .timing import LatencyStats
+
+# Variants whose sessions own native thread pools, which do not survive a fork
+_UNFORKABLE = ("onnx", "int8")
+# A worker exiting sooner than this after its fork is restarted with a delay
+_MIN_UPTIME_S = 1.0
+# How often the parent looks for exited workers
+_POLL_S = 0.2
+# Requests of a replaced worker still running after this long are cut off
+_DRAIN_S = 60.0
+
+
+def load_shared(registry: ModelRegistry) -> None:
+    """Load and warm up (see ModelRegistry) every model whose weight file exists."""
+    for name, path in registry.model_paths.items():
+        if not os.path.exists(path):
+            print(json.dumps({"status": "skipped", "model": name, "reason": "file not found"}),
+                  flush=True)
+            continue
+        handle = registry.get(name)
+        if handle.variant.split("+")[0] in _UNFORKABLE:
+            raise SystemExit(f"{name} runs as {handle.variant}; pre-forked workers need the torch backend")
+
+
+def _serve_worker(index: int, listener: socket.socket, threads: int, shared: dict,
+                  job_workers: int) -> None:
+    forked = time.perf_counter()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+    InferenceHandler.registry = shared["registry"]
+    InferenceHandler.result_cache = shared["result_cache"]
+    InferenceHandler.render_store = shared["render_store"]
+    InferenceHandler.latency = LatencyStats()
+    # Every worker answers job requests from disk; only the first one runs the images
+    InferenceHandler.jobs = JobQueue(shared["registry"], shared["result_cache"], workers=job_workers,
+                                     owner=index == 0, shared=True)
+
+    server = ThreadingHTTPServer(listener.getsockname()[:2], InferenceHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    # Joined by server_close, so a replaced worker finishes its running requests
+    server.daemon_threads = False
+
+    def retire(signum, frame):
+        # shutdown() waits for serve_forever, which runs in this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+        threading.Timer(_DRAIN_S, os._exit, args=(0,)).start()
+
+    signal.signal(signal.SIGUSR1, retire)
+    print(json.dumps({"status": "worker", "index": index, "pid": os.getpid(), "threads": threads,
+                      "startup_ms": round((time.perf_counter() - forked) * 1000, 3)}), flush=True)
+    try:
+        server.serve_forever()
+        server.server_close()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host=HOST, port=PORT, workers=PREFORK_WORKERS, threads=PREFORK_THREADS,
+          result_cache_mb=RESULT_CACHE_MB, batch_window_ms=BATCH_WINDOW_MS,
+          render_cache_mb=RENDER_CACHE_MB, job_workers=JOB_WORKERS, reload_s=MODEL_RELOAD_S):
+    started = time.perf_counter()
+    # No intra-op or OpenCV thread pools in the parent: they would not survive the
+    # fork, and an OpenMP pool created before it can deadlock the workers
+    torch.set_num_threads(1)
+    cv2.setNumThreads(0)
+    workers = max(1, workers)
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+
+    # No budget: an evicted model would be reloaded privately by every worker
+    registry = ModelRegistry(budget_mb=0, batch_window_ms=batch_window_ms)
+    load_shared(registry)
+    shared = {
+        "registry": registry,
+        # Every worker keeps its own index of the directory; their shares add up to the budget
+        "result_cache": ResultCache(max_mb=result_cache_mb / workers) if result_cache_mb > 0 else None,
+        "render_store": RenderStore(max_mb=render_cache_mb, shared=True),
+    }
+    # Keep the collector away from the loaded objects, so it doesn't dirty their pages
+    gc.collect()
+    gc.freeze()
+
+    listener = socket.create_server((host, port), backlog=128)
+    # Idle workers all wake up for a connection; the ones that lose the race get
+    # EAGAIN, which socketserver ignores, instead of blocking in accept()
+    listener.setblocking(False)
+    print(json.dumps({"status": "listening", "host": host, "port": port, "workers": workers,
+                      "threads_per_worker": threads, "models": registry.loaded(),
+                      "load_s": round(time.perf_counter() - started, 3)}), flush=True)
+
+    children = {}
+    retiring = set()
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _serve_worker(index, listener, threads, shared, job_workers)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    def check_reload(seen):
+        reloaded = registry.reload_changed(seen)
+        if not reloaded:
+            return
+        gc.collect()
+        gc.freeze()
+        print(json.dumps({"status": "reloaded",
+                          "models": {handle.name: handle.version for handle in reloaded}}), flush=True)
+        # Replaced by forks of the reloaded parent once their running requests are done
+        for pid in children:
+            if pid not in retiring:
+                os.kill(pid, signal.SIGUSR1)
+                retiring.add(pid)
+
+    for index in range(workers):
+        spawn(index)
+    seen = {}
+    next_check = time.monotonic() + reload_s
+    try:
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(_POLL_S)
+                if reload_s > 0 and not stopping and time.monotonic() >= next_check:
+                    check_reload(seen)
+                    next_check = time.monotonic() + reload_s
+                continue
+            if pid not in children:
+                continue
+            index, forked_at = children.pop(pid)
+            if stopping:
+                continue
+            if pid in retiring:
+                retiring.discard(pid)
+                spawn(index)
+                continue
+            print(json.dumps({"status": "worker exited", "index": index, "pid": pid,
+                              "code": os.waitstatus_to_exitcode(status)}), file=sys.stderr, flush=True)
+            if time.monotonic() - forked_at < _MIN_UPTIME_S:
+                time.sleep(_MIN_UPTIME_S)
+            spawn(index)
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=PREFORK_WORKERS,
+                        help="Worker processes forked from the loaded parent")
+    parser.add_argument("--threads-per-worker", type=int, default=PREFORK_THREADS,
+                        help="torch intra-op threads of each worker (0 = cores / workers)")
+    parser.add_argument("--result-cache-mb", type=float, default=RESULT_CACHE_MB,
+                        help="Disk budget for cached prediction results (0 = disabled)")
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS,
+                        help="Micro-batching window for concurrent requests (0 = disabled)")
+    parser.add_argument("--render-cache-mb", type=float, default=RENDER_CACHE_MB,
+                        help="Disk budget for lazily rendered images (0 = unlimited)")
+    parser.add_argument("--job-workers", type=int, default=JOB_WORKERS,
+                        help="Images of queued jobs predicted at the same time")
+    parser.add_argument("--reload-s", type=float, default=MODEL_RELOAD_S,
+                        help="Check the weight files every this many seconds (0 = never)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads_per_worker, args.result_cache_mb,
+          args.batch_window_ms, args.render_cache_mb, args.job_workers, args.reload_s)
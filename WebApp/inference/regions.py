@@ -0,0 +1,92 @@
+"""Merging of overlapping part boxes before stage 2 of part-first mode.
+
+The part detector often returns several heavily overlapping boxes for one
+leaf or fruit. Boxes headed for the same disease model are clustered by IoU
+or containment, the disease model runs once on each cluster's enclosing
+region, and the region's detections are handed back to every part box of
+the cluster in that part's crop coordinates.
+"""
+from typing import Dict, List
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from .config import PART_MERGE_CONTAINMENT, PART_MERGE_IOU
+
+
+def _overlaps(boxes: np.ndarray, iou: float, containment: float) -> np.ndarray:
+    """(n, n) matrix of pairs overlapping by at least `iou`, or with the smaller
+    box at least `containment` inside the larger one (0 disables a test)."""
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        overlap = np.zeros(inter.shape, dtype=bool)
+        if iou > 0:
+            overlap |= inter / (area[:, None] + area[None, :] - inter) >= iou
+        if containment > 0:
+            overlap |= inter / np.minimum(area[:, None], area[None, :]) >= containment
+    return overlap
+
+
+def merge_parts(parts: List[Dict], plan: list, iou: float = PART_MERGE_IOU,
+                containment: float = PART_MERGE_CONTAINMENT) -> List[Dict]:
+    """Cluster overlapping parts of one class planned for the same model into regions.
+
+    Returns one `{"bbox", "model", "members"}` region per cluster, where
+    `bbox` encloses the members (indices into `parts`); parts planned for no
+    model are left out.
+    """
+    indices = [i for i, model in enumerate(plan) if model is not None]
+    if not indices:
+        return []
+    boxes = np.array([parts[i]["bbox"] for i in indices], dtype=np.float64)
+    same_target = np.array([[plan[i] is plan[j] and parts[i]["class_id"] == parts[j]["class_id"]
+                             for j in indices] for i in indices])
+    linked = _overlaps(boxes, iou, containment) & same_target
+
+    # Connected components, so a chain of overlapping boxes becomes one region
+    cluster = list(range(len(indices)))
+    for a, b in zip(*np.nonzero(np.triu(linked, 1))):
+        root_a, root_b = cluster[a], cluster[b]
+        if root_a != root_b:
+            cluster = [root_a if c == root_b else c for c in cluster]
+
+    regions = {}
+    for k, root in enumerate(cluster):
+        regions.setdefault(root, []).append(k)
+    merged = []
+    for members in regions.values():
+        member_boxes = boxes[members]
+        merged.append({
+            "bbox": [int(member_boxes[:, 0].min()), int(member_boxes[:, 1].min()),
+                     int(member_boxes[:, 2].max()), int(member_boxes[:, 3].max())],
+            "model": plan[indices[members[0]]],
+            "members": [indices[k] for k in members],
+        })
+    return merged
+
+
+def part_result(region_result, region_bbox: List[int], part_bbox: List[int], crop: np.ndarray):
+    """The detections of a region's result that fall in one part, in its crop coordinates.
+
+    A box belongs to the part when its centre lies inside the part box; it is
+    then clipped to the crop. A part that is the whole region keeps the result.
+    """
+    if region_bbox == part_bbox:
+        return region_result
+    data = region_result.boxes.data  # x1, y1, x2, y2, [track id,] conf, cls
+    boxes = torch.cat([data[:, :4], data[:, -2:]], dim=1).float().cpu()
+    boxes[:, [0, 2]] += region_bbox[0] - part_bbox[0]
+    boxes[:, [1, 3]] += region_bbox[1] - part_bbox[1]
+    h, w = crop.shape[:2]
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    boxes = boxes[(cx >= 0) & (cx < w) & (cy >= 0) & (cy < h)]
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clamp(0, w)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clamp(0, h)
+    return Results(crop, path="", names=region_result.names, boxes=boxes)
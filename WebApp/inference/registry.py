@@ -0,0 +1,318 @@
+"""Registry of YOLO models that stay loaded for the lifetime of the worker."""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from ultralytics import YOLO
+
+from .batching import MicroBatcher
+from .config import (BACKEND, BATCH_WINDOW_MS, MAX_BATCH_SIZE, MODEL_CACHE_MB, MODEL_PATHS,
+                     MODEL_PRECISION, MODEL_RELOAD_S, MODEL_TILING, PART_ROUTES, WARMUP_SIZE)
+from .tiling import TileConfig, parse_tiling, tiled_predict
+
+
+def load_model(path: str, backend: str = BACKEND, precision: str = "fp32") -> Tuple[object, str]:
+    """Load weights with the requested backend and precision.
+
+    Returns a YOLO-compatible callable and the variant it actually runs as;
+    a reduced precision that is unavailable or not yet approved by its
+    accuracy gate falls back to fp32 on `backend`.
+    """
+    if precision != "fp32":
+        from .precision import load_reduced_precision
+        model = load_reduced_precision(path, precision)
+        if model is not None:
+            return model, precision
+    if backend == "onnx":
+        from .onnx_backend import load_onnx_model
+        return load_onnx_model(path), backend
+    if backend != "torch":
+        raise ValueError(f"Unknown inference backend: {backend}")
+    return YOLO(path), backend
+
+
+def _file_signature(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _model_nbytes(model) -> int:
+    """Approximate resident size of a model from its parameters and buffers."""
+    if not isinstance(model, YOLO):
+        return model.nbytes
+    module = model.model
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelHandle:
+    """A loaded YOLO model that serialises calls from concurrent requests.
+
+    Single-image calls (stage 1 and direct mode) go through a micro-batcher
+    when `batch_window_ms` is set, so concurrent uploads share one forward
+    pass; list inputs such as the stage-2 crops are already batched and run
+    directly. With `tiling`, single images larger than a tile are sliced
+    instead and their tiles run as one batched call. `version` counts the
+    loads of the file at `path`; `signature` is its (mtime, size) and `sha`
+    the content hash of the bytes that were loaded.
+    """
+
+    def __init__(self, name: str, path: str, model, variant: str = "torch",
+                 batch_window_ms: float = 0, max_batch: int = MAX_BATCH_SIZE,
+                 tiling: TileConfig = None, version: int = 1, signature: Tuple[int, int] = None,
+                 sha: str = ""):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.version = version
+        self.signature = signature
+        self.sha = sha
+        self.tiling = tiling
+        # How the weights are executed; results from different variants may differ slightly
+        self.variant = variant if tiling is None else f"{variant}+tiled{tiling.size}"
+        self.nbytes = _model_nbytes(model)
+        self._lock = threading.Lock()
+        self._batcher = None
+        if batch_window_ms > 0:
+            self._batcher = MicroBatcher(self._run, batch_window_ms, max_batch)
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return self.model.names
+
+    def _run(self, source, **kwargs):
+        kwargs.setdefault("verbose", False)
+        with self._lock:
+            return self.model(source, **kwargs)
+
+    def warm_up(self, size: int = WARMUP_SIZE) -> list:
+        """One inference on a blank `size`x`size` image, so the first request doesn't set up the predictor."""
+        return self._run(np.zeros((size, size, 3), np.uint8))
+
+    def __call__(self, source, **kwargs):
+        if self.tiling is not None and isinstance(source, np.ndarray):
+            return tiled_predict(self._run, source, self.tiling, self.names, **kwargs)
+        if self._batcher is not None and isinstance(source, np.ndarray):
+            return self._batcher.submit(source, kwargs)
+        return self._run(source, **kwargs)
+
+
+class ModelRegistry:
+    """Load each model file once and hand out the same handle afterwards.
+
+    With a `budget_mb`, handles are kept in least-recently-used order and the
+    coldest ones are dropped once the resident size would exceed the budget.
+    A dropped handle that is still in use by a request stays valid until that
+    request finishes; it is simply reloaded the next time it is asked for.
+
+    Every load is warmed up with one inference at `warmup_size` (0 = none),
+    outside the registry lock, so a cold model does not hold up the others.
+    A resident model whose weight file is replaced is loaded again next to
+    the old version, warmed up, checked and then swapped in (see `reload`);
+    requests holding the old handle finish on it.
+    """
+
+    def __init__(self, model_paths: Dict[str, str] = None, budget_mb: float = MODEL_CACHE_MB,
+                 batch_window_ms: float = BATCH_WINDOW_MS, backend: str = BACKEND,
+                 precisions: Dict[str, str] = None, tiling: Dict[str, str] = None,
+                 warmup_size: int = WARMUP_SIZE):
+        self.model_paths = dict(MODEL_PATHS if model_paths is None else model_paths)
+        self.precisions = dict(MODEL_PRECISION if precisions is None else precisions)
+        self.tiling = {name: parse_tiling(spec) for name, spec in
+                       (MODEL_TILING if tiling is None else tiling).items()}
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.batch_window_ms = batch_window_ms
+        self.backend = backend
+        self.warmup_size = warmup_size
+        self._handles: "OrderedDict[str, ModelHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Weight file path -> lock held while that file is loaded and warmed up
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+        # Model name -> why its latest weight file was not swapped in
+        self.reload_errors: Dict[str, str] = {}
+        self._rejected: Dict[str, Tuple[int, int]] = {}
+
+    def resolve(self, name_or_path: str) -> Tuple[str, str]:
+        """Map a registry key or a weight file path to (name, path)."""
+        if name_or_path in self.model_paths:
+            return name_or_path, self.model_paths[name_or_path]
+        path = os.path.abspath(name_or_path)
+        return os.path.splitext(os.path.basename(path))[0], path
+
+    def get(self, name_or_path: str) -> ModelHandle:
+        """Return the resident handle for a model, loading it on first use."""
+        name, path = self.resolve(name_or_path)
+        handle = self._resident(path)
+        if handle is not None:
+            return handle
+        # Load outside the registry lock, so requests for other models are not held up;
+        # concurrent first requests for this one wait for a single load
+        with self._path_lock(path):
+            handle = self._resident(path)
+            if handle is not None:
+                return handle
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Model file not found at {path}")
+            with self._lock:
+                self.misses += 1
+            handle = self._load(name, path)
+            with self._lock:
+                self._handles[path] = handle
+                self._evict(keep=path)
+            return handle
+
+    def _resident(self, path: str) -> Optional[ModelHandle]:
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is not None:
+                self.hits += 1
+                self._handles.move_to_end(path)
+            return handle
+
+    def _path_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(path, threading.Lock())
+
+    def _load(self, name: str, path: str, previous: ModelHandle = None) -> ModelHandle:
+        # Stat before reading, so a write racing with the load shows up as a change
+        signature = _file_signature(path)
+        sha = _file_sha256(path)
+        model, variant = load_model(path, self.backend, self.precisions.get(name, "fp32"))
+        if _file_signature(path) != signature:
+            # The hash may not describe the weights that were loaded
+            raise ValueError(f"{path} changed while it was being loaded")
+        handle = ModelHandle(name, path, model, variant, self.batch_window_ms,
+                             tiling=self.tiling.get(name),
+                             version=previous.version + 1 if previous else 1, signature=signature,
+                             sha=sha)
+        if self.warmup_size > 0:
+            results = handle.warm_up(self.warmup_size)
+            if len(results) != 1 or getattr(results[0], "boxes", None) is None:
+                raise ValueError(f"{name} did not return detections for its warm-up image")
+        if previous is not None and handle.names != previous.names:
+            # Clients, routes and stored renders refer to the classes by index and name
+            raise ValueError(f"{name} changed its classes from {previous.names} to {handle.names}; "
+                             f"restart the worker to switch")
+        return handle
+
+    def reload(self, name_or_path: str) -> ModelHandle:
+        """Load the current weight file of a model and swap it in for the resident version.
+
+        The new version is loaded, warmed up and checked outside the registry
+        lock, so requests keep being served by the old one meanwhile. Raises
+        if the file cannot be loaded or fails the checks; the old version
+        stays in place then.
+        """
+        name, path = self.resolve(name_or_path)
+        with self._path_lock(path):
+            with self._lock:
+                previous = self._handles.get(path)
+            try:
+                handle = self._load(name, path, previous)
+            except Exception as e:
+                with self._lock:
+                    self.reload_errors[name] = str(e)
+                raise
+            with self._lock:
+                self.reload_errors.pop(name, None)
+                if previous is not None:
+                    self.reloads += 1
+                self._handles[path] = handle
+                self._evict(keep=path)
+            return handle
+
+    def watch(self, interval_s: float = MODEL_RELOAD_S) -> None:
+        """Reload resident models whose weight file changed, checking every `interval_s` seconds."""
+        if interval_s > 0:
+            threading.Thread(target=self._watch, args=(interval_s,), daemon=True).start()
+
+    def _watch(self, interval_s: float) -> None:
+        seen: Dict[str, Tuple[int, int]] = {}
+        while True:
+            time.sleep(interval_s)
+            self.reload_changed(seen)
+
+    def reload_changed(self, seen: Dict[str, Tuple[int, int]]) -> List[ModelHandle]:
+        """One check of `watch`: reload the resident models whose weight file changed.
+
+        A file is only loaded once it is unchanged since the previous check,
+        not while it is still being written; `seen` carries the signatures
+        between checks. Returns the handles that were swapped in.
+        """
+        with self._lock:
+            handles = list(self._handles.values())
+        reloaded = []
+        for handle in handles:
+            try:
+                signature = _file_signature(handle.path)
+            except OSError:
+                continue  # being replaced right now
+            if signature == handle.signature or signature == self._rejected.get(handle.path):
+                continue
+            if seen.get(handle.path) != signature:
+                seen[handle.path] = signature
+                continue
+            try:
+                reloaded.append(self.reload(handle.path))
+            except Exception:
+                self._rejected[handle.path] = signature
+        return reloaded
+
+    def part_routes(self, routes: Dict[str, str] = None) -> Dict[str, Optional[ModelHandle]]:
+        """Handles for the part-first routes (see PART_ROUTES); "none" maps to None."""
+        routes = PART_ROUTES if routes is None else routes
+        for name in routes.values():
+            if name != "none" and name not in self.model_paths:
+                raise ValueError(f"Unknown model: {name}")
+        return {part: None if name == "none" else self.get(name) for part, name in routes.items()}
+
+    def _evict(self, keep: str) -> None:
+        if self.budget_bytes <= 0:
+            return
+        while self.resident_bytes() > self.budget_bytes and len(self._handles) > 1:
+            path = next(iter(self._handles))
+            if path == keep:
+                break
+            del self._handles[path]
+            self.evictions += 1
+
+    def resident_bytes(self) -> int:
+        return sum(handle.nbytes for handle in self._handles.values())
+
+    def preload(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.get(name)
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return [handle.name for handle in self._handles.values()]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "loaded": {handle.name: handle.variant for handle in self._handles.values()},
+                "versions": {handle.name: handle.version for handle in self._handles.values()},
+                "resident_mb": round(self.resident_bytes() / (1024 * 1024), 1),
+                "budget_mb": round(self.budget_bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+                "reload_errors": dict(self.reload_errors),
+            }
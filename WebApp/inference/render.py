@@ -0,0 +1,230 @@
+"""Lazy rendering of annotated images and crops for boxes-only responses.
+
+A boxes-only prediction stores the detections it returned as a small render
+job. The annotated image and crops are only drawn, with the same code as an
+eager prediction, when one of their URLs is first requested; the JPEGs are
+then kept next to the job and served from disk.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from .config import RENDER_CACHE_MB, RENDER_DIR, RENDER_SOURCE_MB, RENDER_URL_PREFIX
+from .predict import (annotate_direct, annotate_part_first, crop_parts, direct_predictions,
+                      part_first_predictions)
+
+_RENDER_ID = re.compile(r"^[0-9a-f]{32,64}$")
+_ARTIFACT = re.compile(r"^(annotated|crop_\d+)\.jpg$")
+
+
+def _boxes(result) -> List[List[float]]:
+    data = result.boxes.data.cpu().numpy()  # x1, y1, x2, y2, [track id,] conf, cls
+    return np.concatenate([data[:, :4], data[:, -2:]], axis=1).tolist()
+
+
+def _results(image: np.ndarray, boxes: List[List[float]], names: Dict[int, str]) -> Results:
+    return Results(image, path="", names=names, boxes=torch.tensor(boxes, dtype=torch.float32).reshape(-1, 6))
+
+
+def _int_keys(names: Dict[str, str]) -> Dict[int, str]:
+    return {int(k): v for k, v in names.items()}
+
+
+class RenderStore:
+    """Render jobs under `root/<render id>/`, oldest evicted once `max_mb` is exceeded.
+
+    A render id is the prediction's result-cache key when there is one, so
+    a repeated upload reuses the stored detections and already drawn JPEGs.
+    Images that were sent as pixels rather than a file are held in memory
+    (up to `source_mb`, least recently used dropped first) until drawn; with
+    `shared`, where the URL may be requested from another worker process,
+    they are written next to the job as `source.npy` instead.
+    """
+
+    def __init__(self, root: str = RENDER_DIR, max_mb: float = RENDER_CACHE_MB,
+                 source_mb: float = RENDER_SOURCE_MB, shared: bool = False):
+        self.root = root
+        self.shared = shared
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.source_bytes = int(source_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._render_locks: Dict[str, threading.Lock] = {}
+        self._sources: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+
+    def new_id(self, cache_key: str = None) -> str:
+        return cache_key or uuid.uuid4().hex
+
+    def url(self, render_id: str, artifact: str) -> str:
+        return f"{RENDER_URL_PREFIX}/{render_id}/{artifact}"
+
+    def _job_path(self, render_id: str) -> str:
+        return os.path.join(self.root, render_id, "job.json")
+
+    def _write_job(self, render_id: str, job: Dict) -> None:
+        job_dir = os.path.join(self.root, render_id)
+        os.makedirs(job_dir, exist_ok=True)
+        tmp_path = os.path.join(job_dir, f".job.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._job_path(render_id))
+
+    def _read_job(self, render_id: str) -> Dict:
+        if not _RENDER_ID.match(render_id):
+            raise ValueError(f"Invalid render id: {render_id}")
+        with open(self._job_path(render_id)) as f:
+            return json.load(f)
+
+    def _keep_source(self, render_id: str, image: Optional[np.ndarray]) -> None:
+        if image is None:
+            return
+        if self.shared:
+            job_dir = os.path.join(self.root, render_id)
+            os.makedirs(job_dir, exist_ok=True)
+            tmp_path = os.path.join(job_dir, f".source.{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, image)
+            os.replace(tmp_path, os.path.join(job_dir, "source.npy"))
+            return
+        with self._lock:
+            self._sources[render_id] = image
+            self._sources.move_to_end(render_id)
+            while (sum(source.nbytes for source in self._sources.values()) > self.source_bytes
+                   and len(self._sources) > 1):
+                self._sources.popitem(last=False)
+
+    def get(self, render_id: str, image_path: str, image: np.ndarray = None) -> Optional[List[Dict]]:
+        """Predictions of an existing job, now rendered from `image_path` or `image`."""
+        try:
+            job = self._read_job(render_id)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(os.path.join(self.root, render_id, "annotated.jpg")):
+            self._keep_source(render_id, image)
+        if job["image_path"] != image_path and image_path is not None:
+            # The same content uploaded again; the earlier file may be gone
+            job["image_path"] = image_path
+            self._write_job(render_id, job)
+        os.utime(os.path.join(self.root, render_id))
+        return job["predictions"]
+
+    def save_part_first(self, render_id: str, image_path: str, parts: List[Dict], crop_results: list,
+                        part_names: Dict[int, str], conf_thresh: float,
+                        image: np.ndarray = None) -> List[Dict]:
+        crop_urls = [self.url(render_id, f"crop_{i}.jpg") for i in range(1, len(parts) + 1)]
+        predictions = part_first_predictions(parts, crop_results, part_names, crop_urls, conf_thresh)
+        self._save(render_id, {
+            "image_path": image_path,
+            "detection_method": "part-first",
+            "conf_thresh": conf_thresh,
+            "part_names": part_names,
+            "parts": parts,
+            # Crops can be routed to different disease models, or skipped (None)
+            "crops": [None if result is None else {"names": result.names, "boxes": _boxes(result)}
+                      for result in crop_results],
+            "predictions": predictions,
+        }, image)
+        return predictions
+
+    def save_direct(self, render_id: str, image_path: str, results: list,
+                    disease_names: Dict[int, str], conf_thresh: float,
+                    image: np.ndarray = None) -> List[Dict]:
+        predictions = direct_predictions(results, disease_names, conf_thresh)
+        self._save(render_id, {
+            "image_path": image_path,
+            "detection_method": "direct",
+            "conf_thresh": conf_thresh,
+            "disease_names": disease_names,
+            "boxes": [_boxes(results[0])],
+            "predictions": predictions,
+        }, image)
+        return predictions
+
+    def _save(self, render_id: str, job: Dict, image: np.ndarray = None) -> None:
+        self._keep_source(render_id, image)
+        self._write_job(render_id, job)
+        self._evict(keep=render_id)
+
+    def render(self, render_id: str, artifact: str) -> str:
+        """Path of a rendered artifact, drawing all of the job's artifacts on first request."""
+        if not _ARTIFACT.match(artifact):
+            raise ValueError(f"Invalid artifact: {artifact}")
+        job = self._read_job(render_id)
+        job_dir = os.path.join(self.root, render_id)
+        path = os.path.join(job_dir, artifact)
+
+        with self._lock:
+            lock = self._render_locks.setdefault(render_id, threading.Lock())
+        with lock:
+            if not os.path.exists(os.path.join(job_dir, "annotated.jpg")):
+                with self._lock:
+                    source = self._sources.get(render_id)
+                self._draw(job, job_dir, source)
+        with self._lock:
+            self._render_locks.pop(render_id, None)
+            # Drawn now, the pixels are no longer needed
+            self._sources.pop(render_id, None)
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No {artifact} for {render_id}")
+        return path
+
+    def _draw(self, job: Dict, job_dir: str, source: np.ndarray = None) -> None:
+        # Work on a copy: annotate_part_first pastes into the image it is given
+        source_path = os.path.join(job_dir, "source.npy")
+        if source is not None:
+            image = source.copy()
+        elif os.path.exists(source_path):
+            image = np.load(source_path)
+        else:
+            image = cv2.imread(job["image_path"]) if job["image_path"] else None
+        if image is None:
+            raise FileNotFoundError("Source image is no longer available")
+        conf_thresh = job["conf_thresh"]
+
+        if job["detection_method"] == "part-first":
+            parts = job["parts"]
+            crops = crop_parts(image, parts)
+            crop_results = [None if stored is None
+                            else _results(crop, stored["boxes"], _int_keys(stored["names"]))
+                            for crop, stored in zip(crops, job["crops"])]
+            annotate_part_first(image, parts, crops, crop_results, _int_keys(job["part_names"]),
+                                job_dir, conf_thresh)
+        else:
+            disease_names = _int_keys(job["disease_names"])
+            image, _ = annotate_direct([_results(image, job["boxes"][0], disease_names)],
+                                       disease_names, conf_thresh)
+        # Written last: its presence marks the job as rendered
+        tmp_path = os.path.join(job_dir, f".annotated.{uuid.uuid4().hex}.tmp.jpg")
+        cv2.imwrite(tmp_path, image)
+        os.replace(tmp_path, os.path.join(job_dir, "annotated.jpg"))
+
+    def _evict(self, keep: str) -> None:
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            jobs = []
+            for name in os.listdir(self.root):
+                job_dir = os.path.join(self.root, name)
+                try:
+                    size = sum(os.path.getsize(os.path.join(job_dir, f)) for f in os.listdir(job_dir))
+                    jobs.append((os.path.getmtime(job_dir), name, size))
+                except OSError:
+                    continue
+            total = sum(size for _, _, size in jobs)
+            for _, name, size in sorted(jobs):
+                if total <= self.max_bytes:
+                    break
+                if name != keep:
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                    total -= size
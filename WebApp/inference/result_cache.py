@@ -0,0 +1,187 @@
+"""On-disk cache of prediction results keyed by image content and model weights."""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .config import RESULT_CACHE_DIR, RESULT_CACHE_MB
+from .predict import public_url
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _array_sha256(image) -> str:
+    digest = hashlib.sha256(repr((image.shape, image.dtype.str)).encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+class ResultCache:
+    """Stored `predictions` plus the annotated image and crops they refer to.
+
+    An entry is keyed by the image bytes, the detection method, the models,
+    the confidence threshold and the `sha` of each model handle, the hash of
+    the weights the handle actually loaded. Once a reloaded version of a
+    model is seen, the entries computed with the previous one are purged.
+    Entries are evicted least-recently-used first once `max_mb` is exceeded.
+    """
+
+    def __init__(self, root: str = RESULT_CACHE_DIR, max_mb: float = RESULT_CACHE_MB):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        # Weight file path -> (version, sha) of the newest handle seen for it
+        self._model_versions: Dict[str, Tuple[int, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        found = []
+        for name in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, name)
+            if name.startswith(".tmp"):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            found.append((os.path.getmtime(entry_dir), name, _dir_size(entry_dir)))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+
+    def model_hash(self, model) -> str:
+        """The `sha` of a model handle (see ModelRegistry), purging entries of its older versions."""
+        if model is None:
+            return ""
+        with self._lock:
+            seen = self._model_versions.get(model.path)
+            if seen is None or model.version > seen[0]:
+                self._model_versions[model.path] = (model.version, model.sha)
+        if seen is not None and model.version > seen[0] and model.sha != seen[1]:
+            self._purge_model(seen[1])
+        return model.sha
+
+    def key(self, image_path: str, detection_method: str, part_model, disease_model,
+            conf_thresh: float, variant: str = "", image=None) -> str:
+        """Entry key for model handles; an in-memory `image` is hashed by its pixels instead of `image_path`."""
+        parts = [
+            variant,
+            _file_sha256(image_path) if image is None else _array_sha256(image),
+            detection_method,
+            os.path.basename(part_model.path) if part_model is not None else "",
+            os.path.basename(disease_model.path),
+            repr(float(conf_thresh)),
+            self.model_hash(part_model),
+            self.model_hash(disease_model),
+        ]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str, annotated_path: str, crop_folder: str) -> Optional[List[Dict]]:
+        """Restore a cached result's artifacts to the given paths and return its predictions."""
+        with self._lock:
+            entry_dir = os.path.join(self.root, key)
+            if key not in self._entries and os.path.isdir(entry_dir):
+                # Stored by another worker process sharing the directory
+                self._entries[key] = _dir_size(entry_dir)
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(os.path.join(entry_dir, "meta.json")) as f:
+                    meta = json.load(f)
+                shutil.copyfile(os.path.join(entry_dir, "annotated.jpg"), annotated_path)
+                predictions = meta["predictions"]
+                for prediction in predictions:
+                    if prediction["crop_url"]:
+                        os.makedirs(crop_folder, exist_ok=True)
+                        crop_name = os.path.basename(prediction["crop_url"])
+                        crop_path = os.path.join(crop_folder, crop_name)
+                        shutil.copyfile(os.path.join(entry_dir, "crops", crop_name), crop_path)
+                        prediction["crop_url"] = public_url(crop_path)
+            except (OSError, ValueError, KeyError):
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            os.utime(entry_dir)
+            return predictions
+
+    def put(self, key: str, predictions: List[Dict], annotated_path: str, crop_folder: str,
+            models: Tuple = ()) -> None:
+        tmp_dir = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(os.path.join(tmp_dir, "crops"))
+        shutil.copyfile(annotated_path, os.path.join(tmp_dir, "annotated.jpg"))
+        for prediction in predictions:
+            if prediction["crop_url"]:
+                crop_name = os.path.basename(prediction["crop_url"])
+                shutil.copyfile(os.path.join(crop_folder, crop_name),
+                                os.path.join(tmp_dir, "crops", crop_name))
+        meta = {
+            "predictions": predictions,
+            "model_hashes": [model.sha for model in models if model is not None],
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        with self._lock:
+            entry_dir = os.path.join(self.root, key)
+            if key in self._entries:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # Another worker process stored the same result first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            self._entries[key] = _dir_size(entry_dir)
+            while sum(self._entries.values()) > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+        shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+    def _purge_model(self, model_hash: str) -> None:
+        """Drop every entry that was computed with weights that have since been reloaded."""
+        with self._lock:
+            for key in list(self._entries):
+                try:
+                    with open(os.path.join(self.root, key, "meta.json")) as f:
+                        stale = model_hash in json.load(f)["model_hashes"]
+                except (OSError, ValueError, KeyError):
+                    stale = True
+                if stale:
+                    self._remove(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(sum(self._entries.values()) / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
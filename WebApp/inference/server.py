@@ -0,0 +1,324 @@
+"""Long-lived localhost HTTP server that keeps the YOLO models resident.
+
+Run from the WebApp directory:
+
+    python -m inference.server --preload strawberry_tuned best_strawberry_disease_model
+"""
+import argparse
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from .config import (BACKEND, BATCH_WINDOW_MS, CONF_THRESH, HOST, JOB_WORKERS, MAX_CROPS,
+                     MIN_CROP_AREA, MODEL_CACHE_MB, PORT, PUBLIC_DIR, RENDER_CACHE_MB,
+                     RESULT_CACHE_MB)
+from .jobs import JobQueue
+from .predict import predict_disease
+from .registry import ModelRegistry
+from .render import RenderStore
+from .result_cache import ResultCache
+from .timing import LatencyStats, StageTimer
+
+
+# Channel order of a raw pixel body -> conversion to the BGR layout the models expect
+_TO_BGR = {
+    ("rgb", 3): cv2.COLOR_RGB2BGR,
+    ("rgb", 4): cv2.COLOR_RGBA2BGR,
+    ("bgr", 4): cv2.COLOR_BGRA2BGR,
+    ("rgb", 1): cv2.COLOR_GRAY2BGR,
+    ("bgr", 1): cv2.COLOR_GRAY2BGR,
+}
+
+
+def _flag(value) -> bool:
+    return value not in (False, "false", "0")
+
+
+def _public_path(path: str, field: str) -> str:
+    """Only let clients have files read or written below public/."""
+    public_dir = os.path.realpath(PUBLIC_DIR)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([real_path, public_dir]) != public_dir:
+        raise ValueError(f"{field} must be inside public/")
+    return real_path
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    registry: ModelRegistry = None
+    result_cache: ResultCache = None
+    render_store: RenderStore = None
+    latency: LatencyStats = None
+    jobs: JobQueue = None
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, path, content_type):
+        with open(path, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        # A render id never changes content once drawn
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self):
+        # No Content-Length: the body is newline-delimited JSON up to connection close
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.close_connection = True
+
+    def _send_line(self, record):
+        try:
+            self.wfile.write(json.dumps(record).encode("utf-8") + b"\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client left; the prediction still finishes and fills the caches
+            pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _read_image(self, content_type):
+        """Decode a request body of raw pixels or encoded image bytes to a BGR array.
+
+        Raw pixels are uint8 with their layout in `X-Image-Shape` ("h,w,c")
+        and channel order in `X-Image-Channels` ("rgb" or "bgr").
+        """
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if content_type.startswith("image/"):
+            image = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError("Failed to decode image")
+            return image
+
+        shape = tuple(int(v) for v in self.headers.get("X-Image-Shape", "").split(",") if v)
+        if self.headers.get("X-Image-Dtype", "uint8") != "uint8":
+            raise ValueError("Only uint8 pixel buffers are supported")
+        if len(shape) != 3 or int(np.prod(shape)) != len(body):
+            raise ValueError("Pixel buffer does not match X-Image-Shape")
+        pixels = np.frombuffer(body, np.uint8).reshape(shape)
+        channels = self.headers.get("X-Image-Channels", "rgb").lower()
+        if (channels, shape[2]) == ("bgr", 3):
+            return pixels.copy()  # frombuffer views are read-only
+        if (channels, shape[2]) not in _TO_BGR:
+            raise ValueError(f"Unsupported pixel layout: {channels} with {shape[2]} channels")
+        return cv2.cvtColor(pixels, _TO_BGR[(channels, shape[2])])
+
+    def _get_model(self, name):
+        # Only registry keys are accepted over HTTP, never arbitrary weight paths
+        if name not in self.registry.model_paths:
+            raise ValueError(f"Unknown model: {name}")
+        return self.registry.get(name)
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._send_json({"status": "ok", "pid": os.getpid(), "models": self.registry.loaded()})
+        if self.path == "/stats":
+            stats = {"models": self.registry.stats()}
+            if self.result_cache is not None:
+                stats["results"] = self.result_cache.stats()
+            return self._send_json(stats)
+        if self.path.startswith("/render/"):
+            return self._render(self.path.split("?")[0][len("/render/"):])
+        url = urlparse(self.path)
+        if url.path.startswith("/jobs/"):
+            return self._job(url.path[len("/jobs/"):])
+        if url.path == "/timings":
+            summary = self.latency.summary()
+            if _flag(parse_qs(url.query).get("reset", ["0"])[-1]):
+                self.latency.reset()
+            return self._send_json(summary)
+        self._send_json({"error": "Not found"}, status=404)
+
+    def _render(self, path):
+        try:
+            render_id, artifact = path.split("/")
+            return self._send_file(self.render_store.render(render_id, artifact), "image/jpeg")
+        except ValueError as e:
+            return self._send_json({"error": str(e)}, status=400)
+        except (OSError, KeyError) as e:
+            return self._send_json({"error": str(e)}, status=404)
+
+    def _job(self, path):
+        job_id, _, view = path.partition("/")
+        try:
+            if view == "":
+                return self._send_json(self.jobs.status(job_id))
+            if view == "bundle":
+                return self._send_file(self.jobs.bundle(job_id), "application/zip")
+            if view == "events":
+                self.jobs.status(job_id)  # unknown ids get a 404 before the stream starts
+                self._start_stream()
+                for status in self.jobs.events(job_id):
+                    self._send_line(status)
+                return
+        except ValueError as e:
+            return self._send_json({"error": str(e)}, status=400)
+        except (KeyError, OSError) as e:
+            return self._send_json({"error": str(e)}, status=404)
+        self._send_json({"error": "Not found"}, status=404)
+
+    def _submit_job(self):
+        try:
+            request = self._read_json()
+            status = self.jobs.submit(
+                request["image_paths"],
+                request.get("names") or [os.path.basename(p) for p in request["image_paths"]],
+                request.get("detection_method", "direct"),
+                request.get("part_model"),
+                request["disease_model"],
+                float(request.get("conf_thresh", CONF_THRESH)),
+            )
+        except (ValueError, KeyError, FileNotFoundError) as e:
+            return self._send_json({"error": str(e)}, status=400)
+        self._send_json(status, status=202)
+
+    def _reload(self):
+        try:
+            name = self._read_json()["model"]
+            if name not in self.registry.model_paths:
+                raise ValueError(f"Unknown model: {name}")
+            handle = self.registry.reload(name)
+        except (ValueError, KeyError, OSError) as e:
+            return self._send_json({"error": str(e)}, status=400)
+        self._send_json({"model": name, "version": handle.version})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/jobs":
+            return self._submit_job()
+        if url.path == "/reload":
+            return self._reload()
+        if url.path != "/predict":
+            return self._send_json({"error": "Not found"}, status=404)
+        timer = StageTimer()
+        try:
+            content_type = self.headers.get("Content-Type", "application/json")
+            image = None
+            with timer.stage("read_body"):
+                if content_type.startswith("application/json"):
+                    request = self._read_json()
+                    image_path = request["image_path"]
+                else:
+                    # The image itself is the body; the other fields come in the query string
+                    request = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                    image = self._read_image(content_type)
+                    image_path = None
+            detection_method = request.get("detection_method", "direct")
+            min_crop_area = int(request.get("min_crop_area", MIN_CROP_AREA))
+            max_crops = int(request.get("max_crops", MAX_CROPS))
+            stream = _flag(request.get("stream", False))
+            conf_thresh = float(request.get("conf_thresh", CONF_THRESH))
+            if not 0 <= conf_thresh <= 1:
+                raise ValueError(f"conf_thresh must be between 0 and 1, got {conf_thresh}")
+            part_model = routes = None
+            # Zero unless the model had to be loaded (or reloaded after eviction)
+            with timer.stage("model_load"):
+                if detection_method == "part-first":
+                    part_model = self._get_model(request["part_model"])
+                    routes = self.registry.part_routes()
+                disease_model = self._get_model(request["disease_model"])
+            render = _flag(request.get("render", True))
+            annotated_path = request.get("annotated_path")
+            if annotated_path:
+                annotated_path = _public_path(annotated_path, "annotated_path")
+            if image_path:
+                # It is read back by the render store, or overwritten without an annotated_path
+                image_path = _public_path(image_path, "image_path")
+        except (ValueError, TypeError, KeyError, FileNotFoundError) as e:
+            return self._send_json({"error": str(e)}, status=400)
+
+        on_prediction = None
+        if stream:
+            self._start_stream()
+
+            def on_prediction(index, prediction):
+                self._send_line({"type": "prediction", "index": index, "prediction": prediction})
+
+        result = predict_disease(
+            image_path,
+            detection_method,
+            part_model,
+            disease_model,
+            conf_thresh=conf_thresh,
+            annotated_path=annotated_path,
+            result_cache=self.result_cache,
+            # render=false returns boxes only; images are drawn when their URLs are fetched
+            render_store=None if render else self.render_store,
+            image=image,
+            routes=routes,
+            min_crop_area=min_crop_area,
+            max_crops=max_crops,
+            on_prediction=on_prediction,
+            timer=timer,
+        )
+        if "error" not in result:
+            model = request["disease_model"]
+            if part_model is not None:
+                model = f"{request['part_model']}>{model}"
+            self.latency.record(timer, f"{detection_method}:{model}")
+        if _flag(request.get("timing", False)):
+            result["timings"] = timer.report()
+        if stream:
+            return self._send_line({"type": "result", **result})
+        self._send_json(result)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host=HOST, port=PORT, preload=(), cache_mb=MODEL_CACHE_MB,
+          result_cache_mb=RESULT_CACHE_MB, batch_window_ms=BATCH_WINDOW_MS, backend=BACKEND,
+          render_cache_mb=RENDER_CACHE_MB, job_workers=JOB_WORKERS):
+    registry = ModelRegistry(budget_mb=cache_mb, batch_window_ms=batch_window_ms, backend=backend)
+    registry.preload(preload)
+    registry.watch()
+    InferenceHandler.registry = registry
+    if result_cache_mb > 0:
+        InferenceHandler.result_cache = ResultCache(max_mb=result_cache_mb)
+    InferenceHandler.render_store = RenderStore(max_mb=render_cache_mb)
+    InferenceHandler.latency = LatencyStats()
+    InferenceHandler.jobs = JobQueue(registry, InferenceHandler.result_cache, workers=job_workers)
+    server = ThreadingHTTPServer((host, port), InferenceHandler)
+    print(json.dumps({"status": "listening", "host": host, "port": port}), flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--preload", nargs="*", default=[],
+                        help="Registry keys to load before accepting requests")
+    parser.add_argument("--cache-mb", type=float, default=MODEL_CACHE_MB,
+                        help="RAM budget for resident models (0 = unlimited)")
+    parser.add_argument("--result-cache-mb", type=float, default=RESULT_CACHE_MB,
+                        help="Disk budget for cached prediction results (0 = disabled)")
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS,
+                        help="Micro-batching window for concurrent requests (0 = disabled)")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default=BACKEND)
+    parser.add_argument("--render-cache-mb", type=float, default=RENDER_CACHE_MB,
+                        help="Disk budget for lazily rendered images (0 = unlimited)")
+    parser.add_argument("--job-workers", type=int, default=JOB_WORKERS,
+                        help="Images of queued jobs predicted at the same time")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.preload, args.cache_mb, args.result_cache_mb,
+          args.batch_window_ms, args.backend, args.render_cache_mb, args.job_workers)
@@ -0,0 +1,85 @@
+"""Sliced inference for high-resolution photos.
+
+A single-image call is cut into overlapping square tiles that run through
+the model in batches; the tile detections are shifted back to full-image
+coordinates and merged with class-aware NMS. Small lesions keep their
+pixels instead of being downsampled with the whole frame, and an optional
+full-frame pass keeps objects larger than a tile from being split up.
+"""
+from typing import Callable, List, NamedTuple, Tuple
+
+import numpy as np
+import torch
+from torchvision.ops import batched_nms
+from ultralytics.engine.results import Results
+
+from .config import STAGE2_BATCH_SIZE, TILE_NMS_IOU
+
+
+class TileConfig(NamedTuple):
+    size: int
+    overlap: float = 0.2
+    full_frame: bool = True
+
+
+def parse_tiling(spec: str) -> TileConfig:
+    """Parse "<size>[:<overlap>[:noframe]]", e.g. "1024:0.25"."""
+    fields = spec.split(":")
+    config = TileConfig(int(fields[0]))
+    if len(fields) > 1:
+        config = config._replace(overlap=float(fields[1]))
+    if len(fields) > 2:
+        config = config._replace(full_frame=fields[2] != "noframe")
+    if config.size <= 0 or not 0 <= config.overlap < 1:
+        raise ValueError(f"Invalid tiling: {spec}")
+    return config
+
+
+def tile_origins(length: int, size: int, overlap: float) -> List[int]:
+    """Start offsets of tiles covering `length`; the last tile ends flush with the edge."""
+    if length <= size:
+        return [0]
+    stride = max(1, int(size * (1 - overlap)))
+    origins = list(range(0, length - size, stride))
+    return origins + [length - size]
+
+
+def tile_windows(shape: Tuple[int, int], config: TileConfig) -> List[Tuple[int, int, int, int]]:
+    h, w = shape
+    return [(x, y, min(x + config.size, w), min(y + config.size, h))
+            for y in tile_origins(h, config.size, config.overlap)
+            for x in tile_origins(w, config.size, config.overlap)]
+
+
+def _detections(result) -> torch.Tensor:
+    data = result.boxes.data  # x1, y1, x2, y2, [track id,] conf, cls
+    return torch.cat([data[:, :4], data[:, -2:]], dim=1).float().cpu()
+
+
+def tiled_predict(run: Callable, image: np.ndarray, config: TileConfig, names,
+                  batch_size: int = STAGE2_BATCH_SIZE, iou: float = TILE_NMS_IOU,
+                  **kwargs) -> List[Results]:
+    """Run `run` over the tiles of `image` and return one merged `Results`.
+
+    Images that fit in a single tile are passed through unchanged.
+    """
+    h, w = image.shape[:2]
+    if h <= config.size and w <= config.size:
+        return run(image, **kwargs)
+
+    windows = tile_windows((h, w), config)
+    tiles = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+    detections = []
+    if config.full_frame:
+        detections.append(_detections(run(image, **kwargs)[0]))
+    for start in range(0, len(tiles), batch_size):
+        results = run(tiles[start:start + batch_size], **kwargs)
+        for (x1, y1, _, _), result in zip(windows[start:start + batch_size], results):
+            det = _detections(result)
+            det[:, [0, 2]] += x1
+            det[:, [1, 3]] += y1
+            detections.append(det)
+
+    merged = torch.cat(detections) if detections else torch.zeros((0, 6))
+    keep = batched_nms(merged[:, :4], merged[:, 4], merged[:, 5].long(), iou)
+    return [Results(image, path="", names=names, boxes=merged[keep])]
@@ -0,0 +1,113 @@
+"""Per-stage latency of predictions.
+
+A `StageTimer` measures the stages of one request with a monotonic clock;
+`LatencyStats` folds finished timers into log-spaced histograms per stage
+and model so percentiles can be reported without keeping every sample.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+# Histogram buckets grow by this factor from _MIN_MS; ~5% relative resolution
+_GROWTH = 1.05
+_MIN_MS = 0.01
+PERCENTILES = (50, 95, 99)
+
+
+class StageTimer:
+    """Milliseconds spent in each named stage of one request.
+
+    Entering a stage again (e.g. once per stage-2 batch) adds to its total.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, ms: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def report(self) -> Dict[str, float]:
+        report = {name: round(ms, 3) for name, ms in self.stages.items()}
+        report["total"] = round(self.total_ms(), 3)
+        return report
+
+
+@contextmanager
+def timed(timer, name: str):
+    """`timer.stage(name)` when a timer is given, otherwise a no-op."""
+    if timer is None:
+        yield
+    else:
+        with timer.stage(name):
+            yield
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, ms: float) -> None:
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        bucket = max(0, int(math.log(max(ms, _MIN_MS) / _MIN_MS, _GROWTH)))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, q: float) -> float:
+        """Upper edge of the bucket holding the q-th percentile, capped at the maximum."""
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(_MIN_MS * _GROWTH ** (bucket + 1), self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> Dict[str, float]:
+        summary = {"count": self.count, "mean": round(self.sum_ms / self.count, 3)}
+        summary.update({f"p{q}": round(self.percentile(q), 3) for q in PERCENTILES})
+        summary["max"] = round(self.max_ms, 3)
+        return summary
+
+
+class LatencyStats:
+    """Thread-safe latency histograms keyed by (stage, model)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], _Histogram] = {}
+
+    def record(self, timer: StageTimer, model: str) -> None:
+        report = timer.report()
+        with self._lock:
+            for stage, ms in report.items():
+                self._histograms.setdefault((stage, model), _Histogram()).add(ms)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{stage: {model: {count, mean, p50, p95, p99, max}}} in milliseconds."""
+        with self._lock:
+            summary = {}
+            for (stage, model), histogram in sorted(self._histograms.items()):
+                summary.setdefault(stage, {})[model] = histogram.summary()
+            return summary
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
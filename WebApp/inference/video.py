@@ -0,0 +1,270 @@
+"""Part-first detection on video files, frame directories and cameras.
+
+Stage 1 runs on every `stride`-th frame. Part boxes are tracked across
+those frames by IoU, falling back to centroid distance, and the disease
+model only runs on a tracked part when the track is new, its crop has
+visibly changed, or its last disease result is `refresh` processed frames
+old. Every processed frame yields one record, and the run ends with a
+disease timeline per track.
+
+Run from the WebApp directory:
+
+    python -m inference.video rail_camera.mp4 --stride 3 --output tracks.ndjson
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .config import CONF_THRESH, MAX_CROPS, MIN_CROP_AREA
+from .dataset import IMAGE_EXTENSIONS
+from .predict import crop_parts, detect_parts, plan_stage2, run_stage2, secondary_detections
+
+# Side of the grey thumbnail a crop is compared by
+_SIGNATURE_SIZE = 16
+
+
+def read_frames(source: str, stride: int = 1) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """Yield (frame index, seconds, BGR frame) for every `stride`-th frame.
+
+    `source` is a video file, a directory of images (sorted by name, timed
+    at 25 fps) or a camera index such as "0". Skipped video frames are only
+    grabbed, not decoded.
+    """
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+        for index in range(0, len(names), stride):
+            frame = cv2.imread(os.path.join(source, names[index]))
+            if frame is not None:
+                yield index, index / 25.0, frame
+        return
+
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Cannot open video source: {source}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    index = 0
+    try:
+        while True:
+            if index % stride:
+                if not capture.grab():
+                    break
+            else:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                yield index, index / fps, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def crop_signature(crop: np.ndarray) -> np.ndarray:
+    grey = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(grey, (_SIGNATURE_SIZE, _SIGNATURE_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class Track:
+    def __init__(self, track_id: int, part: Dict, frame: int):
+        self.track_id = track_id
+        self.part = part
+        self.first_frame = frame
+        self.last_seen = frame
+        self.missed = 0
+        self.signature: Optional[np.ndarray] = None
+        self.detections: Optional[List[Dict]] = None
+        self.checked_frame = -1
+        self.timeline: List[Dict] = []
+
+
+class PartTracker:
+    """Greedy IoU matching of part boxes to tracks of the same class.
+
+    A part that overlaps no track by `iou` is matched to the nearest
+    unmatched track whose centre is within `centroid` box diagonals. Tracks
+    unmatched for more than `max_missed` processed frames are closed.
+    """
+
+    def __init__(self, iou: float = 0.3, centroid: float = 0.5, max_missed: int = 5):
+        self.iou = iou
+        self.centroid = centroid
+        self.max_missed = max_missed
+        self.active: List[Track] = []
+        self.closed: List[Track] = []
+        self._next_id = 1
+
+    def update(self, parts: List[Dict], frame: int) -> List[Track]:
+        """Assign this frame's parts to tracks; returns the track of each part, in order."""
+        assigned: List[Optional[Track]] = [None] * len(parts)
+        free = list(range(len(self.active)))
+        if parts and self.active:
+            part_boxes = np.array([p["bbox"] for p in parts], dtype=np.float64)
+            track_boxes = np.array([t.part["bbox"] for t in self.active], dtype=np.float64)
+            same_class = (np.array([p["class_id"] for p in parts])[:, None]
+                          == np.array([t.part["class_id"] for t in self.active])[None, :])
+            iou = np.where(same_class, _iou_matrix(part_boxes, track_boxes), 0.0)
+            for i, j in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                if iou[i, j] < self.iou:
+                    break
+                if assigned[i] is None and j in free:
+                    assigned[i] = self.active[j]
+                    free.remove(j)
+
+            centres_p = (part_boxes[:, :2] + part_boxes[:, 2:]) / 2
+            centres_t = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+            diagonals = np.hypot(track_boxes[:, 2] - track_boxes[:, 0], track_boxes[:, 3] - track_boxes[:, 1])
+            for i in range(len(parts)):
+                if assigned[i] is not None or not free:
+                    continue
+                candidates = [j for j in free if same_class[i, j]]
+                if not candidates:
+                    continue
+                distances = np.hypot(*(centres_t[candidates] - centres_p[i]).T) / diagonals[candidates]
+                k = int(np.argmin(distances))
+                if distances[k] <= self.centroid:
+                    assigned[i] = self.active[candidates[k]]
+                    free.remove(candidates[k])
+
+        for j in free:
+            self.active[j].missed += 1
+        for i, part in enumerate(parts):
+            if assigned[i] is None:
+                assigned[i] = Track(self._next_id, part, frame)
+                self._next_id += 1
+                self.active.append(assigned[i])
+            assigned[i].part = part
+            assigned[i].last_seen = frame
+            assigned[i].missed = 0
+
+        self.closed += [t for t in self.active if t.missed > self.max_missed]
+        self.active = [t for t in self.active if t.missed <= self.max_missed]
+        return assigned
+
+    def tracks(self) -> List[Track]:
+        return sorted(self.closed + self.active, key=lambda t: t.track_id)
+
+
+def track_video(source: str, part_model, disease_model, stride: int = 1,
+                conf_thresh: float = CONF_THRESH, change: float = 12.0, refresh: int = 30,
+                tracker: PartTracker = None, routes: Dict[str, object] = None,
+                min_crop_area: int = MIN_CROP_AREA, max_crops: int = MAX_CROPS) -> Iterator[Dict]:
+    """Yield a record per processed frame, then a summary with per-track timelines.
+
+    A track's disease detections are reused while the mean absolute
+    difference of its crop thumbnail stays below `change` grey levels and its
+    last check is fewer than `refresh` processed frames old (0 = never forced).
+    """
+    tracker = tracker or PartTracker()
+    started = time.perf_counter()
+    processed = stage2_runs = reused = 0
+    last_frame = -1
+
+    for processed, (frame_index, seconds, frame) in enumerate(read_frames(source, stride), 1):
+        last_frame = frame_index
+        parts = detect_parts(part_model, frame, conf_thresh)
+        tracks = tracker.update(parts, frame_index)
+        crops = crop_parts(frame, parts)
+        signatures = [crop_signature(crop) for crop in crops]
+
+        # Only new, changed or stale tracks go back through the disease model
+        plan = plan_stage2(parts, part_model.names, disease_model, routes, min_crop_area, max_crops)
+        for i, track in enumerate(tracks):
+            if plan[i] is None or track.signature is None:
+                continue
+            diff = float(np.abs(signatures[i] - track.signature).mean())
+            stale = refresh and processed - track.checked_frame >= refresh
+            if diff < change and not stale:
+                plan[i] = None
+        results = run_stage2(crops, plan, conf_thresh)
+
+        records = []
+        for i, (track, result) in enumerate(zip(tracks, results)):
+            ran = plan[i] is not None
+            if ran:
+                stage2_runs += 1
+                track.signature = signatures[i]
+                track.checked_frame = processed
+                detections = secondary_detections(result, conf_thresh)
+                if detections != track.detections:
+                    track.timeline.append({"frame": frame_index, "time": round(seconds, 3),
+                                           "secondary_detections": detections})
+                track.detections = detections
+            elif track.detections is not None:
+                reused += 1
+            records.append({
+                "track_id": track.track_id,
+                "part": part_model.names[track.part["class_id"]],
+                "confidence": track.part["confidence"],
+                "bbox": track.part["bbox"],
+                "secondary_detections": track.detections or [],
+                "reused": not ran,
+            })
+        yield {"type": "frame", "frame": frame_index, "time": round(seconds, 3), "tracks": records}
+
+    elapsed = time.perf_counter() - started
+    yield {
+        "type": "summary",
+        "frames": last_frame + 1,
+        "processed_frames": processed,
+        "seconds": round(elapsed, 3),
+        # Source frames covered per second, the rate a live camera has to be kept up with
+        "fps": round((last_frame + 1) / elapsed, 2) if elapsed else None,
+        "processed_fps": round(processed / elapsed, 2) if elapsed else None,
+        "stage2_runs": stage2_runs,
+        "stage2_reused": reused,
+        "tracks": [{
+            "track_id": track.track_id,
+            "part": part_model.names[track.part["class_id"]],
+            "first_frame": track.first_frame,
+            "last_frame": track.last_seen,
+            "timeline": track.timeline,
+        } for track in tracker.tracks()],
+    }
+
+
+if __name__ == "__main__":
+    from .registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="Video file, directory of frames or camera index")
+    parser.add_argument("--part-model", default="strawberry_tuned")
+    parser.add_argument("--disease-model", default="best_strawberry_disease_model")
+    parser.add_argument("--stride", type=int, default=1, help="Run stage 1 on every Nth frame")
+    parser.add_argument("--conf", type=float, default=CONF_THRESH)
+    parser.add_argument("--change", type=float, default=12.0,
+                        help="Mean grey-level change of a crop that triggers a new disease pass")
+    parser.add_argument("--refresh", type=int, default=30,
+                        help="Re-check a track after this many processed frames (0 = only on change)")
+    parser.add_argument("--output", help="Write the NDJSON records here instead of stdout")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(batch_window_ms=0)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for record in track_video(args.source, registry.get(args.part_model),
+                                  registry.get(args.disease_model), args.stride, args.conf,
+                                  args.change, args.refresh):
+            out.write(json.dumps(record) + "\n")
+            if record["type"] == "summary":
+                print(f"{record['fps']} fps ({record['processed_fps']} processed), "
+                      f"{record['stage2_runs']} disease passes, {record['stage2_reused']} reused",
+                      file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
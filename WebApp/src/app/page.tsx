@@ -84,13 +84,40 @@ export default function Home() {
       formData.append("partModel", selectedPartModel);
       formData.append("diseaseModel", selectedDiseaseModel);
       
-      const response = await fetch("/api/process-image-new", {
+      const response = await fetch("/api/process-image-stream", {
         method: "POST",
         body: formData,
       });
       
-      if (!response.ok) throw new Error("Image processing failed");
-      const result = await response.json();
+      if (!response.ok || !response.body) throw new Error("Image processing failed");
+
+      // Parts arrive one by one as Server-Sent Events, then the full result
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const partial: PredictionResult[] = [];
+      let buffered = "";
+      let result: { processedImageUrl: string; predictions: PredictionResult[] } | null = null;
+      while (!result) {
+        const { done, value } = await reader.read();
+        buffered += decoder.decode(value, { stream: !done });
+        const messages = buffered.split("\n\n");
+        buffered = done ? "" : messages.pop() ?? "";
+        for (const message of messages) {
+          const event = message.match(/^event: (.*)$/m)?.[1];
+          const data = message.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
+          const payload = JSON.parse(data);
+          if (event === "prediction") {
+            partial[payload.index] = payload.prediction;
+            setPredictions(partial.filter(Boolean));
+          } else if (event === "result") {
+            result = payload;
+          } else {
+            throw new Error(payload.error || "Image processing failed");
+          }
+        }
+        if (done && !result) throw new Error("Image processing stream ended early");
+      }
       
       setProcessedImage((prev) => ({
         originalUrl: prev?.originalUrl || "",
@@ -290,7 +317,8 @@ export default function Home() {
               )}
 
               {/* Detected Crops Section */}
-              {detectionMethod === "part-first" && predictions.length > 0 && (
+              {/* Crop images are written once the whole prediction is done */}
+              {detectionMethod === "part-first" && predictions.length > 0 && !isProcessing && (
                 <div className="space-y-4">
                   <p className="font-medium text-center text-gray-700">
                     Detected Crops
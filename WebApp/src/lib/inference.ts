@@ -0,0 +1,289 @@
+import { spawn, type ChildProcess } from "child_process";
+import path from "path";
+import type { Sharp } from "sharp";
+
+export interface SecondaryDetection {
+  disease: string;
+  confidence: number;
+}
+
+export interface PredictionResult {
+  primary_detection: {
+    disease: string;
+    confidence: number;
+    bbox: number[];
+  };
+  secondary_detections: SecondaryDetection[];
+  crop_url: string;
+}
+
+// Decoded pixels, sent to the worker as-is instead of going through a file
+export interface RawImage {
+  data: Buffer;
+  width: number;
+  height: number;
+  channels: number;
+}
+
+export interface PredictionRequest {
+  // Either a file the worker reads, or the decoded image itself
+  imagePath?: string;
+  image?: RawImage;
+  // Where an eagerly rendered annotated image is written (inside public/)
+  annotatedPath?: string;
+  detectionMethod: string;
+  partModel?: string;
+  diseaseModel: string;
+  confThresh?: number;
+  // Draw the annotated image and crops up front instead of on first request
+  render?: boolean;
+  // Have the worker report the milliseconds spent in each stage
+  timing?: boolean;
+}
+
+export interface PredictionResponse {
+  predictions: PredictionResult[];
+  // Set for boxes-only predictions; otherwise the annotated image replaced the input
+  annotatedUrl?: string;
+  // Worker stage timings, when requested
+  timings?: Record<string, number>;
+}
+
+// Payload of the worker's /predict endpoint
+interface WorkerResult {
+  success?: boolean;
+  predictions?: PredictionResult[];
+  annotated_url?: string;
+  timings?: Record<string, number>;
+  error?: string;
+}
+
+// One record of a streamed prediction: a finished part, then the final payload
+export type PredictionEvent =
+  | { type: "prediction"; index: number; prediction: PredictionResult }
+  | ({ type: "result" } & WorkerResult);
+
+export interface JobRequest {
+  // Files already placed in JOB_INCOMING_DIR; the worker moves them into the job
+  imagePaths: string[];
+  names: string[];
+  detectionMethod: string;
+  partModel?: string;
+  diseaseModel: string;
+  confThresh?: number;
+}
+
+// Must match the worker's INFERENCE_JOB_DIR
+export const JOB_INCOMING_DIR = path.join(
+  process.env.INFERENCE_JOB_DIR || path.join(process.cwd(), ".cache", "jobs"),
+  "incoming"
+);
+
+const INFERENCE_PORT = process.env.INFERENCE_PORT || "8001";
+const INFERENCE_URL = process.env.INFERENCE_URL || `http://127.0.0.1:${INFERENCE_PORT}`;
+const STARTUP_TIMEOUT_MS = 120_000;
+const RENDER_EAGERLY = process.env.INFERENCE_RENDER === "eager";
+
+// Keep the worker across Next.js hot reloads so it is only spawned once
+const globalForWorker = globalThis as unknown as {
+  inferenceWorker?: ChildProcess;
+  inferenceWorkerReady?: Promise<void>;
+};
+
+async function isWorkerHealthy(): Promise<boolean> {
+  try {
+    const response = await fetch(`${INFERENCE_URL}/health`);
+    return response.ok;
+  } catch {
+    return false;
+  }
+}
+
+function startWorker(): Promise<void> {
+  const worker = spawn("python", ["-m", "inference.server", "--port", INFERENCE_PORT], {
+    cwd: process.cwd(),
+    stdio: ["ignore", "inherit", "inherit"],
+  });
+  globalForWorker.inferenceWorker = worker;
+
+  return new Promise<void>((resolve, reject) => {
+    const startedAt = Date.now();
+    let exited = false;
+
+    worker.on("exit", (code) => {
+      exited = true;
+      globalForWorker.inferenceWorker = undefined;
+      globalForWorker.inferenceWorkerReady = undefined;
+      console.error("Inference worker exited with code:", code);
+    });
+
+    const poll = async () => {
+      if (exited) {
+        return reject(new Error("Inference worker exited during startup"));
+      }
+      if (await isWorkerHealthy()) {
+        return resolve();
+      }
+      if (Date.now() - startedAt > STARTUP_TIMEOUT_MS) {
+        return reject(new Error(`Inference worker did not start within ${STARTUP_TIMEOUT_MS} ms`));
+      }
+      setTimeout(poll, 250);
+    };
+    poll();
+  });
+}
+
+function ensureWorker(): Promise<void> {
+  if (!globalForWorker.inferenceWorkerReady) {
+    globalForWorker.inferenceWorkerReady = (async () => {
+      if (await isWorkerHealthy()) return;
+      // An external worker was configured; don't fork a local one behind its back
+      if (process.env.INFERENCE_URL) {
+        throw new Error(`Inference worker at ${INFERENCE_URL} is not reachable`);
+      }
+      await startWorker();
+    })().catch((error) => {
+      globalForWorker.inferenceWorkerReady = undefined;
+      throw error;
+    });
+  }
+  return globalForWorker.inferenceWorkerReady;
+}
+
+// Finish a sharp pipeline as raw RGB pixels rather than an encoded file
+export async function decodeForInference(pipeline: Sharp): Promise<RawImage> {
+  const { data, info } = await pipeline.removeAlpha().raw().toBuffer({ resolveWithObject: true });
+  return { data, width: info.width, height: info.height, channels: info.channels };
+}
+
+function predictionFields(request: PredictionRequest, stream: boolean) {
+  return {
+    detection_method: request.detectionMethod,
+    part_model: request.partModel,
+    disease_model: request.diseaseModel,
+    conf_thresh: request.confThresh,
+    render: request.render ?? RENDER_EAGERLY,
+    annotated_path: request.annotatedPath,
+    stream: stream || undefined,
+    timing: request.timing || undefined,
+  };
+}
+
+function predictionRequest(request: PredictionRequest, stream = false): [string, RequestInit] {
+  if (!request.image) {
+    return [`${INFERENCE_URL}/predict`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ image_path: request.imagePath, ...predictionFields(request, stream) }),
+    }];
+  }
+
+  // The pixels are the body, so the other fields travel in the query string
+  const params = new URLSearchParams();
+  for (const [key, value] of Object.entries(predictionFields(request, stream))) {
+    if (value !== undefined) params.set(key, String(value));
+  }
+  const { data, width, height, channels } = request.image;
+  return [`${INFERENCE_URL}/predict?${params}`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/octet-stream",
+      "X-Image-Shape": `${height},${width},${channels}`,
+      "X-Image-Dtype": "uint8",
+      "X-Image-Channels": "rgb",
+    },
+    body: data,
+  }];
+}
+
+async function sendPrediction(request: PredictionRequest, stream: boolean): Promise<Response> {
+  await ensureWorker();
+  try {
+    return await fetch(...predictionRequest(request, stream));
+  } catch (error) {
+    // Worker went away; check it again (and respawn if local) on the next request
+    globalForWorker.inferenceWorkerReady = undefined;
+    throw error;
+  }
+}
+
+function predictionResponse(result: WorkerResult): PredictionResponse {
+  if (result.error) {
+    throw new Error(result.error);
+  } else if (result.success && Array.isArray(result.predictions)) {
+    return { predictions: result.predictions, annotatedUrl: result.annotated_url, timings: result.timings };
+  }
+  throw new Error("Invalid prediction results format");
+}
+
+export async function runPrediction(request: PredictionRequest): Promise<PredictionResponse> {
+  const response = await sendPrediction(request, false);
+  return predictionResponse(await response.json());
+}
+
+// Like runPrediction, but hands over each part-first prediction as soon as its
+// crop is done. Crop URLs only resolve once the returned promise has settled.
+export async function streamPrediction(
+  request: PredictionRequest,
+  onPrediction: (index: number, prediction: PredictionResult) => void
+): Promise<PredictionResponse> {
+  const response = await sendPrediction(request, true);
+  if (!response.body) throw new Error("Inference worker sent no stream");
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value, { stream: !done });
+    const lines = buffered.split("\n");
+    buffered = done ? "" : lines.pop() ?? "";
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const event: PredictionEvent = JSON.parse(line);
+      if (event.type === "prediction") {
+        onPrediction(event.index, event.prediction);
+      } else {
+        return predictionResponse(event);
+      }
+    }
+    if (done) break;
+  }
+  throw new Error("Inference worker closed the stream without a result");
+}
+
+// Per-stage latency histograms of the worker, optionally clearing them
+export async function fetchTimings(reset = false): Promise<unknown> {
+  await ensureWorker();
+  const response = await fetch(`${INFERENCE_URL}/timings${reset ? "?reset=1" : ""}`);
+  return response.json();
+}
+
+export async function submitJob(request: JobRequest): Promise<Response> {
+  await ensureWorker();
+  return fetch(`${INFERENCE_URL}/jobs`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      image_paths: request.imagePaths,
+      names: request.names,
+      detection_method: request.detectionMethod,
+      part_model: request.partModel,
+      disease_model: request.diseaseModel,
+      conf_thresh: request.confThresh,
+    }),
+  });
+}
+
+// Status, NDJSON progress ("events") or zip ("bundle") of a job, for the API routes to relay
+export async function fetchJob(jobId: string, view: "" | "events" | "bundle" = ""): Promise<Response> {
+  await ensureWorker();
+  const suffix = view ? `/${view}` : "";
+  return fetch(`${INFERENCE_URL}/jobs/${encodeURIComponent(jobId)}${suffix}`);
+}
+
+// Fetch a lazily rendered image of a boxes-only prediction from the worker
+export async function fetchRender(renderPath: string): Promise<Response> {
+  await ensureWorker();
+  return fetch(`${INFERENCE_URL}/render/${renderPath}`);
+}
@@ -0,0 +1,92 @@
+import { performance } from "perf_hooks";
+
+// Per-stage latency of the API routes, mirroring inference/timing.py: a
+// StageTimer per request, folded into log-spaced histograms per route and stage.
+
+const GROWTH = 1.05;
+const MIN_MS = 0.01;
+const PERCENTILES = [50, 95, 99];
+
+export type StageTimings = Record<string, number>;
+
+export class StageTimer {
+  readonly stages: StageTimings = {};
+  private readonly startedAt = performance.now();
+
+  async time<T>(stage: string, work: () => Promise<T>): Promise<T> {
+    const start = performance.now();
+    try {
+      return await work();
+    } finally {
+      this.stages[stage] = (this.stages[stage] ?? 0) + performance.now() - start;
+    }
+  }
+
+  report(): StageTimings {
+    const report: StageTimings = {};
+    for (const [stage, ms] of Object.entries(this.stages)) report[stage] = round(ms);
+    report.total = round(performance.now() - this.startedAt);
+    return report;
+  }
+}
+
+interface Histogram {
+  count: number;
+  sumMs: number;
+  maxMs: number;
+  buckets: Map<number, number>;
+}
+
+// Keep the histograms across Next.js hot reloads
+const globalForTimings = globalThis as unknown as {
+  apiHistograms?: Map<string, Map<string, Histogram>>;
+};
+const histograms: Map<string, Map<string, Histogram>> = (globalForTimings.apiHistograms ??= new Map());
+
+function round(ms: number): number {
+  return Math.round(ms * 1000) / 1000;
+}
+
+export function recordTimings(route: string, timer: StageTimer): void {
+  for (const [stage, ms] of Object.entries(timer.report())) {
+    let byRoute = histograms.get(stage);
+    if (!byRoute) histograms.set(stage, (byRoute = new Map()));
+    let histogram = byRoute.get(route);
+    if (!histogram) byRoute.set(route, (histogram = { count: 0, sumMs: 0, maxMs: 0, buckets: new Map() }));
+
+    histogram.count += 1;
+    histogram.sumMs += ms;
+    histogram.maxMs = Math.max(histogram.maxMs, ms);
+    const bucket = Math.max(0, Math.floor(Math.log(Math.max(ms, MIN_MS) / MIN_MS) / Math.log(GROWTH)));
+    histogram.buckets.set(bucket, (histogram.buckets.get(bucket) ?? 0) + 1);
+  }
+}
+
+function percentile(histogram: Histogram, q: number): number {
+  const rank = Math.ceil((histogram.count * q) / 100);
+  let seen = 0;
+  for (const bucket of [...histogram.buckets.keys()].sort((a, b) => a - b)) {
+    seen += histogram.buckets.get(bucket)!;
+    if (seen >= rank) return Math.min(MIN_MS * GROWTH ** (bucket + 1), histogram.maxMs);
+  }
+  return histogram.maxMs;
+}
+
+// {stage: {route: {count, mean, p50, p95, p99, max}}} in milliseconds
+export function timingSummary(): Record<string, Record<string, Record<string, number>>> {
+  const summary: Record<string, Record<string, Record<string, number>>> = {};
+  for (const [stage, byRoute] of histograms) {
+    summary[stage] = {};
+    for (const [route, histogram] of byRoute) {
+      const entry: Record<string, number> = { count: histogram.count, mean: round(histogram.sumMs / histogram.count) };
+      for (const q of PERCENTILES) entry[`p${q}`] = round(percentile(histogram, q));
+      entry.max = round(histogram.maxMs);
+      summary[stage][route] = entry;
+    }
+  }
+  return summary;
+}
+
+export function resetTimings(): void {
+  histograms.clear();
+}
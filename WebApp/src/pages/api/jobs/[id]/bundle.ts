@@ -0,0 +1,30 @@
+import type { NextApiRequest, NextApiResponse } from "next";
+import { fetchJob } from "src/lib/inference";
+
+// Zip of a finished job: predictions.json plus the annotated images and crops
+export default async function handler(
+  req: NextApiRequest,
+  res: NextApiResponse
+) {
+  if (req.method !== "GET") {
+    return res.status(405).json({ message: "Method not allowed" });
+  }
+
+  try {
+    const jobId = String(req.query.id);
+    const response = await fetchJob(jobId, "bundle");
+    if (!response.ok) {
+      const result = await response.json();
+      return res.status(response.status).json({ message: result.error });
+    }
+    res.setHeader("Content-Type", "application/zip");
+    res.setHeader("Content-Disposition", `attachment; filename="job-${jobId}.zip"`);
+    return res.status(200).send(Buffer.from(await response.arrayBuffer()));
+  } catch (error) {
+    console.error("Error downloading job:", error);
+    return res.status(500).json({
+      message: "Error downloading job",
+      error: String(error),
+    });
+  }
+}
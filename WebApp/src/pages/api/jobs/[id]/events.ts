@@ -0,0 +1,52 @@
+import type { NextApiRequest, NextApiResponse } from "next";
+import { fetchJob } from "src/lib/inference";
+
+// A job's progress as Server-Sent Events: a `progress` event on every change
+// (and every 15 s while idle), ending with the first status in state "done"
+export default async function handler(
+  req: NextApiRequest,
+  res: NextApiResponse
+) {
+  if (req.method !== "GET") {
+    return res.status(405).json({ message: "Method not allowed" });
+  }
+
+  let response: Response;
+  try {
+    response = await fetchJob(String(req.query.id), "events");
+  } catch (error) {
+    console.error("Error following job:", error);
+    return res.status(500).json({ message: "Error following job", error: String(error) });
+  }
+  if (!response.ok || !response.body) {
+    const result = await response.json();
+    return res.status(response.status).json({ message: result.error });
+  }
+
+  res.writeHead(200, {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache, no-transform",
+    Connection: "keep-alive",
+  });
+  const reader = response.body.getReader();
+  req.on("close", () => reader.cancel().catch(() => {}));
+
+  const decoder = new TextDecoder();
+  let buffered = "";
+  try {
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffered += decoder.decode(value, { stream: !done });
+      const lines = buffered.split("\n");
+      buffered = done ? "" : lines.pop() ?? "";
+      for (const line of lines) {
+        if (line.trim()) res.write(`event: progress\ndata: ${line}\n\n`);
+      }
+      if (done) break;
+    }
+  } catch (error) {
+    res.write(`event: error\ndata: ${JSON.stringify({ error: String(error) })}\n\n`);
+  } finally {
+    res.end();
+  }
+}
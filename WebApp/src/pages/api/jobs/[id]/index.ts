@@ -0,0 +1,27 @@
+import type { NextApiRequest, NextApiResponse } from "next";
+import { fetchJob } from "src/lib/inference";
+
+// Progress counts and per-image predictions of a job
+export default async function handler(
+  req: NextApiRequest,
+  res: NextApiResponse
+) {
+  if (req.method !== "GET") {
+    return res.status(405).json({ message: "Method not allowed" });
+  }
+
+  try {
+    const response = await fetchJob(String(req.query.id));
+    const result = await response.json();
+    if (!response.ok) {
+      return res.status(response.status).json({ message: result.error });
+    }
+    return res.status(200).json(result);
+  } catch (error) {
+    console.error("Error fetching job:", error);
+    return res.status(500).json({
+      message: "Error fetching job",
+      error: String(error),
+    });
+  }
+}
@@ -0,0 +1,83 @@
+import type { NextApiRequest, NextApiResponse } from "next";
+import formidable, { Fields, Files } from "formidable";
+import fs from "fs";
+import path from "path";
+import sharp from "sharp";
+import { JOB_INCOMING_DIR, submitJob } from "src/lib/inference";
+
+export const config = {
+  api: {
+    bodyParser: false,
+  },
+};
+
+const MAX_IMAGES = 500;
+
+// Queue many images as one job; answers 202 with the job id and its status.
+// Poll /api/jobs/<id>, follow /api/jobs/<id>/events and fetch /api/jobs/<id>/bundle.
+export default async function handler(
+  req: NextApiRequest,
+  res: NextApiResponse
+) {
+  if (req.method !== "POST") {
+    return res.status(405).json({ message: "Method not allowed" });
+  }
+
+  try {
+    const form = formidable({
+      keepExtensions: true,
+      maxFiles: MAX_IMAGES,
+      maxFileSize: 10 * 1024 * 1024,
+      maxTotalFileSize: MAX_IMAGES * 10 * 1024 * 1024,
+      filter: (part) => part.mimetype?.includes("image/") || false,
+    });
+
+    const [fields, files] = await new Promise<[Fields, Files]>((resolve, reject) => {
+      form.parse(req, (err, fields, files) => {
+        if (err) return reject(err);
+        resolve([fields, files]);
+      });
+    });
+
+    const uploads = files.images ?? [];
+    if (uploads.length === 0) {
+      return res.status(400).json({ message: "No images uploaded" });
+    }
+
+    const detectionMethod = String(fields.detectionMethod ?? "direct");
+    const partModel = fields.partModel ? String(fields.partModel) : undefined;
+    const diseaseModel = String(fields.diseaseModel ?? "best_strawberry_disease_model");
+
+    // Same preprocessing as a single upload, written where the worker takes job images from
+    fs.mkdirSync(JOB_INCOMING_DIR, { recursive: true });
+    const batch = `${Date.now()}-${Math.random().toString(36).slice(2, 10)}`;
+    const imagePaths = await Promise.all(
+      uploads.map(async (file, index) => {
+        const imagePath = path.join(JOB_INCOMING_DIR, `${batch}-${index}.jpg`);
+        await sharp(file.filepath).rotate().sharpen().jpeg({ quality: 95 }).toFile(imagePath);
+        await fs.promises.rm(file.filepath, { force: true });
+        return imagePath;
+      })
+    );
+
+    const response = await submitJob({
+      imagePaths,
+      names: uploads.map((file, index) => file.originalFilename || `image-${index}.jpg`),
+      detectionMethod,
+      partModel: detectionMethod === "part-first" ? partModel : undefined,
+      diseaseModel,
+    });
+    const result = await response.json();
+    if (!response.ok) {
+      await Promise.all(imagePaths.map((imagePath) => fs.promises.rm(imagePath, { force: true })));
+      return res.status(response.status).json({ message: result.error });
+    }
+    return res.status(202).json({ jobId: result.id, ...result });
+  } catch (error) {
+    console.error("Error submitting job:", error);
+    return res.status(500).json({
+      message: "Error submitting job",
+      error: String(error),
+    });
+  }
+}
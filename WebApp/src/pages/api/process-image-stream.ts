@@ -0,0 +1,109 @@
+import type { NextApiRequest, NextApiResponse } from "next";
+import formidable, { Fields, Files } from "formidable";
+import fs from "fs";
+import path from "path";
+import sharp from "sharp";
+import { decodeForInference, streamPrediction } from "src/lib/inference";
+import { recordTimings, StageTimer } from "src/lib/timing";
+
+export const config = {
+  api: {
+    bodyParser: false,
+  },
+};
+
+// Same upload as process-image-new, answered as Server-Sent Events: a
+// `prediction` event per finished part crop, then one `result` or `error` event
+export default async function handler(
+  req: NextApiRequest,
+  res: NextApiResponse
+) {
+  if (req.method !== "POST") {
+    return res.status(405).json({ message: "Method not allowed" });
+  }
+
+  // ?timing=1 adds the per-stage breakdown to the result event
+  const timer = new StageTimer();
+  const wantTimings = req.query.timing === "1";
+
+  const form = formidable({
+    keepExtensions: true,
+    maxFiles: 1,
+    maxFileSize: 10 * 1024 * 1024,
+    filter: (part) => part.mimetype?.includes("image/") || false,
+  });
+
+  let fields: Fields;
+  let files: Files;
+  try {
+    [fields, files] = await timer.time("parse_upload", () =>
+      new Promise<[Fields, Files]>((resolve, reject) => {
+        form.parse(req, (err, fields, files) => {
+          if (err) return reject(err);
+          resolve([fields, files]);
+        });
+      })
+    );
+  } catch (error) {
+    return res.status(400).json({ message: "Invalid upload", error: String(error) });
+  }
+
+  const file = Array.isArray(files.image) ? files.image[0] : files.image;
+  if (!file) {
+    return res.status(400).json({ message: "No image uploaded" });
+  }
+
+  res.writeHead(200, {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache, no-transform",
+    Connection: "keep-alive",
+  });
+  const send = (event: string, data: unknown) => {
+    res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+  };
+
+  try {
+    const detectionMethod = String(fields.detectionMethod);
+    const partModel = String(fields.partModel);
+    const diseaseModel = String(fields.diseaseModel);
+
+    const uploadsDir = path.join(process.cwd(), "public", "uploads");
+    if (!fs.existsSync(uploadsDir)) {
+      fs.mkdirSync(uploadsDir, { recursive: true });
+    }
+
+    const safeFilename = `${Date.now()}-${path.basename(file.originalFilename || "image.jpg").replace(/[^a-zA-Z0-9.-]/g, "_")}`;
+    const processedImagePath = path.join(uploadsDir, `processed-${safeFilename}`);
+
+    const image = await timer.time("preprocess", () =>
+      decodeForInference(sharp(file.filepath).sharpen())
+    );
+
+    const { predictions, annotatedUrl, timings } = await timer.time("inference", () =>
+      streamPrediction(
+        {
+          image,
+          annotatedPath: processedImagePath,
+          detectionMethod,
+          partModel: detectionMethod === "part-first" ? partModel : undefined,
+          diseaseModel,
+          timing: wantTimings,
+        },
+        (index, prediction) => send("prediction", { index, prediction })
+      )
+    );
+    recordTimings("process-image-stream", timer);
+
+    send("result", {
+      message: "Image processed successfully",
+      processedImageUrl: annotatedUrl ?? `/uploads/processed-${safeFilename}?t=${Date.now()}`,
+      predictions,
+      ...(wantTimings && { timings: { api: timer.report(), worker: timings } }),
+    });
+  } catch (error) {
+    console.error("Error processing image:", error);
+    send("error", { message: "Error processing image", error: String(error) });
+  } finally {
+    res.end();
+  }
+}
@@ -0,0 +1,34 @@
+import type { NextApiRequest, NextApiResponse } from "next";
+import { fetchRender } from "src/lib/inference";
+
+// Annotated images and crops of boxes-only predictions, drawn by the worker on first request
+export default async function handler(
+  req: NextApiRequest,
+  res: NextApiResponse
+) {
+  if (req.method !== "GET") {
+    return res.status(405).json({ message: "Method not allowed" });
+  }
+
+  const segments = Array.isArray(req.query.path) ? req.query.path : [req.query.path ?? ""];
+  if (segments.length !== 2) {
+    return res.status(404).json({ message: "Not found" });
+  }
+
+  try {
+    const response = await fetchRender(segments.map(encodeURIComponent).join("/"));
+    if (!response.ok) {
+      const result = await response.json();
+      return res.status(response.status).json({ message: result.error });
+    }
+    res.setHeader("Content-Type", response.headers.get("Content-Type") || "image/jpeg");
+    res.setHeader("Cache-Control", "public, max-age=31536000, immutable");
+    return res.status(200).send(Buffer.from(await response.arrayBuffer()));
+  } catch (error) {
+    console.error("Error rendering image:", error);
+    return res.status(500).json({
+      message: "Error rendering image",
+      error: String(error),
+    });
+  }
+}
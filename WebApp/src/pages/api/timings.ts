@@ -0,0 +1,23 @@
+import type { NextApiRequest, NextApiResponse } from "next";
+import { fetchTimings } from "src/lib/inference";
+import { resetTimings, timingSummary } from "src/lib/timing";
+
+// Latency percentiles per stage: API routes by route, worker stages by model.
+// ?reset=1 clears both after reading.
+export default async function handler(
+  req: NextApiRequest,
+  res: NextApiResponse
+) {
+  if (req.method !== "GET") {
+    return res.status(405).json({ message: "Method not allowed" });
+  }
+
+  const reset = req.query.reset === "1";
+  const api = timingSummary();
+  if (reset) resetTimings();
+  try {
+    return res.status(200).json({ api, worker: await fetchTimings(reset) });
+  } catch (error) {
+    return res.status(200).json({ api, worker: null, error: String(error) });
+  }
+}
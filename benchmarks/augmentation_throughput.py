@@ -0,0 +1,141 @@
+"""Throughput of the batched augmentation engine against the per-variation loops.
+
+Run from the repository root:
+
+    python benchmarks/augmentation_throughput.py --variations 8 32 --output augment.json
+
+Each pipeline generates K variations of one image, once with the loop the
+ImageAugmentor scripts used (a copy of the original per variation, run
+through the single-image transforms of legacy_augment.py) and once with
+`augmentation.Augmenter.generate`. Both are warmed up and timed `--repeat`
+times, and the medians are reported as images per second.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+import cv2
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "model_training", "data_augmentation"))
+
+from augmentation import GROW_LIGHT_COLORS, Augmenter, ColoredLight, HSVGain, standard_augmenter
+from hsv import augment_hsv
+from legacy_augment import LegacyAugmentor
+
+SEED = 0
+
+
+def synthetic_image(width: int = 1280, height: int = 960) -> np.ndarray:
+    """Seeded green noise with red and dark blobs, so every colour range is exercised."""
+    rng = np.random.default_rng(SEED)
+    image = rng.normal((60, 140, 70), 25, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    for _ in range(40):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = (40, 40, 200) if rng.random() < 0.5 else (30, 50, 40)
+        cv2.circle(image, center, int(rng.integers(10, 80)), color, -1)
+    return image
+
+
+def loop_standard(augmentor: LegacyAugmentor, k: int) -> list:
+    """augment.py's generate_variations before the batched engine."""
+    variations = []
+    for _ in range(k):
+        img = augmentor.original.copy()
+        if random.random() > 0.5:
+            img, _ = augmentor.adjust_color_temperature(img, random.uniform(-1, 1))
+        if random.random() > 0.5:
+            img, _ = augmentor.color_jitter(img)
+        if random.random() > 0.5:
+            img, _ = augmentor.channel_shift(img)
+        if random.random() > 0.5:
+            color = random.choice([(255, 255, 0), (255, 0, 255)])
+            img, _ = augmentor.add_colored_lighting(img, color, random.uniform(0.1, 0.3))
+        variations.append(img)
+    return variations
+
+
+def loop_grow_light(augmentor: LegacyAugmentor, k: int) -> list:
+    """many_light.py's generate_variations before the batched engine."""
+    variations = []
+    for _ in range(k):
+        img = augmentor.original.copy()
+        light = GROW_LIGHT_COLORS[random.choice(list(GROW_LIGHT_COLORS))]
+        img, _ = augmentor.add_colored_lighting(img, light['rgb'], random.uniform(*light['intensity_range']))
+        variations.append(img)
+    return variations
+
+
+def loop_hsv(augmentor: LegacyAugmentor, k: int) -> list:
+    """hsv.py's augment_hsv, once per variation."""
+    return [augment_hsv(augmentor.original.copy()) for _ in range(k)]
+
+
+def median_s(fn: Callable, repeat: int) -> float:
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def run(image_path: str, variations, repeat: int) -> Dict[str, Dict]:
+    random.seed(SEED)
+    augmentor = LegacyAugmentor(image_path)
+    image = augmentor.original
+    pipelines = {
+        "standard": (loop_standard, standard_augmenter(SEED)),
+        "grow_light": (loop_grow_light, Augmenter([ColoredLight(GROW_LIGHT_COLORS, p=1.0)], SEED)),
+        "hsv_gain": (loop_hsv, Augmenter([HSVGain(p=1.0)], SEED)),
+    }
+    results = {}
+    print(f"{'case':<24} {'loop img/s':>12} {'batched img/s':>14} {'speed-up':>9}", file=sys.stderr)
+    for name, (loop, augmenter) in pipelines.items():
+        for k in variations:
+            loop_s = median_s(lambda: loop(augmentor, k), repeat)
+            batched_s = median_s(lambda: augmenter.generate(image, k), repeat)
+            case = f"{name}[k={k}]"
+            results[case] = {
+                "loop_images_per_s": round(k / loop_s, 1),
+                "batched_images_per_s": round(k / batched_s, 1),
+                "speedup": round(loop_s / batched_s, 2),
+            }
+            print(f"{case:<24} {results[case]['loop_images_per_s']:>12.1f} "
+                  f"{results[case]['batched_images_per_s']:>14.1f} {results[case]['speedup']:>8.2f}x",
+                  file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", help="Photo to augment (default: a seeded synthetic 1280x960 image)")
+    parser.add_argument("--variations", type=int, nargs="+", default=[8, 32], help="K per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--output", help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_path = args.image
+        if image_path is None:
+            image_path = os.path.join(tmp_dir, "synthetic.png")
+            cv2.imwrite(image_path, synthetic_image())
+        shape = cv2.imread(image_path).shape
+        results = run(image_path, args.variations, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"image": args.image or "synthetic", "shape": list(shape),
+                       "repeat": args.repeat, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""The single-image transforms of the old augment.ImageAugmentor, for the benchmarks.
+
+Each one works on one RGB image and draws its parameters from the `random`
+module, as the per-variation loops did before the batched engine in
+model_training/data_augmentation/augmentation.py replaced them.
+"""
+import random
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+from augmentation import ImageAugmentor
+
+
+class LegacyAugmentor(ImageAugmentor):
+    """An ImageAugmentor with the old per-image transforms, as a reference to time against."""
+
+    def adjust_color_temperature(self, image: np.ndarray, 
+                               temperature: float) -> Tuple[np.ndarray, float]:
+        """Adjust color temperature (warm/cool)."""
+        img = image.copy()
+        if temperature > 0:  # Warmer
+            img = img.astype(float)
+            img[:,:,0] *= (1 + temperature * 0.1)  # More red
+            img[:,:,2] *= (1 - temperature * 0.1)  # Less blue
+        else:  # Cooler
+            img = img.astype(float)
+            img[:,:,0] *= (1 + temperature * 0.1)  # Less red
+            img[:,:,2] *= (1 - temperature * 0.1)  # More blue
+        return np.clip(img, 0, 255).astype(np.uint8), temperature
+
+    def color_jitter(self, image: np.ndarray) -> Tuple[np.ndarray, Dict[str, float]]:
+        """Apply random color jittering."""
+        # Generate random values
+        hue_shift = random.uniform(-10, 10)
+        sat_scale = random.uniform(0.5, 1.5)
+        val_scale = random.uniform(0.7, 1.3)
+        
+        # Convert to HSV
+        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV).astype(np.float32)
+        
+        # Apply adjustments
+        hsv[:,:,0] += hue_shift
+        hsv[:,:,1] *= sat_scale
+        hsv[:,:,2] *= val_scale
+        
+        # Ensure values are in valid range
+        hsv[:,:,0] = np.clip(hsv[:,:,0], 0, 179)
+        hsv[:,:,1] = np.clip(hsv[:,:,1], 0, 255)
+        hsv[:,:,2] = np.clip(hsv[:,:,2], 0, 255)
+        
+        jitter_info = {
+            'hue': round(hue_shift, 2),
+            'saturation': round(sat_scale, 2),
+            'value': round(val_scale, 2)
+        }
+        
+        return cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2RGB), jitter_info
+
+    def add_colored_lighting(self, image: np.ndarray, 
+                           color: Tuple[int, int, int], 
+                           intensity: float) -> Tuple[np.ndarray, Dict[str, float]]:
+        """Add colored lighting effect."""
+        color_layer = np.full_like(image, color)
+        blend = cv2.addWeighted(image, 1, color_layer, intensity, 0)
+        
+        color_name = "yellow" if color == (255, 255, 0) else "purple"
+        light_info = {
+            'color': color_name,
+            'intensity': round(intensity, 2)
+        }
+        
+        return blend, light_info
+
+    def channel_shift(self, image: np.ndarray) -> Tuple[np.ndarray, Dict[str, float]]:
+        """Apply random channel shifting."""
+        shifts = [random.uniform(-30, 30) for _ in range(3)]
+        shifted = image.astype(np.float32)
+        
+        for i in range(3):
+            shifted[:,:,i] += shifts[i]
+            
+        shift_info = {
+            'R': round(shifts[0], 2),
+            'G': round(shifts[1], 2),
+            'B': round(shifts[2], 2)
+        }
+        
+        return np.clip(shifted, 0, 255).astype(np.uint8), shift_info
@@ -0,0 +1,259 @@
+"""Offline micro-benchmarks of the detection pipeline and the augmentation transforms.
+
+Run from the repository root:
+
+    python benchmarks/run_benchmarks.py --output benchmarks/results.json
+    python benchmarks/run_benchmarks.py --save-baseline      # on the reference machine
+    python benchmarks/run_benchmarks.py --threshold 0.15     # exit 1 on a >15% slowdown
+
+Every case is warmed up, then timed `--repeat` times with a monotonic clock;
+the median is compared with the stored baseline. Inputs are fixed: the first
+Inastek image of each disease folder, or a seeded synthetic photo with
+`--synthetic`, and the bundled weights in WebApp/models.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "WebApp"))
+sys.path.insert(0, os.path.join(REPO_DIR, "model_training", "data_augmentation"))
+
+from inference.config import MODEL_PATHS
+from inference.dataset import inastek_images
+from inference.predict import (annotate_direct, annotate_part_first, crop_parts, detect_parts,
+                               direct_predictions, part_first_predictions, plan_stage2,
+                               predict_disease, run_stage2)
+from inference.registry import ModelRegistry, load_model
+
+from legacy_augment import LegacyAugmentor
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+PART_MODEL = "strawberry_tuned"
+DISEASE_MODEL = "best_strawberry_disease_model"
+CROP_COUNTS = (1, 10, 50)
+SEED = 0
+
+
+def measure(fn: Callable, repeat: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times = np.array(times)
+    return {
+        "runs": repeat,
+        "median_ms": round(float(np.median(times)), 3),
+        "mean_ms": round(float(times.mean()), 3),
+        "min_ms": round(float(times.min()), 3),
+        "p95_ms": round(float(np.percentile(times, 95)), 3),
+    }
+
+
+def machine_metadata() -> Dict:
+    import torch
+    import ultralytics
+
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu = next(line.split(":", 1)[1].strip() for line in f if line.startswith("model name"))
+    except (OSError, StopIteration):
+        pass
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "cuda": torch.cuda.is_available(),
+        "versions": {"numpy": np.__version__, "opencv": cv2.__version__,
+                     "torch": torch.__version__, "ultralytics": ultralytics.__version__},
+    }
+
+
+def synthetic_image(width: int = 1280, height: int = 960) -> np.ndarray:
+    """A seeded stand-in photo: green noise with red and dark blobs."""
+    rng = np.random.default_rng(SEED)
+    image = rng.normal((60, 140, 70), 25, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    for _ in range(40):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = (40, 40, 200) if rng.random() < 0.5 else (30, 50, 40)
+        cv2.circle(image, center, int(rng.integers(10, 80)), color, -1)
+    return image
+
+
+def bench_images(synthetic: bool) -> List[np.ndarray]:
+    if not synthetic:
+        first_per_disease = {}
+        for disease, path in inastek_images():
+            first_per_disease.setdefault(disease, path)
+        images = [cv2.imread(path) for path in first_per_disease.values()]
+        images = [image for image in images if image is not None]
+        if images:
+            return images
+    return [synthetic_image()]
+
+
+def grid_parts(image: np.ndarray, n: int) -> List[Dict]:
+    """`n` non-overlapping part boxes on a grid, so stage 2 sees exactly `n` crops."""
+    h, w = image.shape[:2]
+    cols = int(np.ceil(np.sqrt(n * w / h)))
+    rows = int(np.ceil(n / cols))
+    cw, ch = w // cols, h // rows
+    return [{"bbox": [c * cw, r * ch, (c + 1) * cw, (r + 1) * ch], "class_id": 0, "confidence": 0.9}
+            for r in range(rows) for c in range(cols)][:n]
+
+
+def run_benchmarks(images: List[np.ndarray], repeat: int, only: str = None) -> Dict[str, Dict]:
+    random.seed(SEED)
+    np.random.seed(SEED)
+    results = {}
+
+    def case(name: str, fn: Callable, runs: int = repeat, warmup: int = 1):
+        if only and only not in name:
+            return
+        results[name] = measure(fn, runs, warmup)
+        print(f"{name:<40} {results[name]['median_ms']:>10.2f} ms", file=sys.stderr)
+
+    # Cold loads; no warm-up so the first read of the weights counts too
+    for key in (PART_MODEL, DISEASE_MODEL):
+        case(f"model_load[{key}]", lambda key=key: load_model(MODEL_PATHS[key]),
+             runs=max(1, repeat // 4), warmup=0)
+
+    registry = ModelRegistry(batch_window_ms=0, tiling={})
+    part_model = registry.get(PART_MODEL)
+    disease_model = registry.get(DISEASE_MODEL)
+    image = images[0]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        annotated_path = os.path.join(tmp_dir, "annotated.jpg")
+
+        def predict_all(method):
+            for img in images:
+                predict_disease(None, method, part_model, disease_model, image=img,
+                                annotated_path=annotated_path)
+
+        case("predict_disease[direct]", lambda: predict_all("direct"))
+        case("predict_disease[part-first]", lambda: predict_all("part-first"))
+        case("stage1[detect_parts]", lambda: [detect_parts(part_model, img) for img in images])
+
+        for n in CROP_COUNTS:
+            parts = grid_parts(image, n)
+            crops = crop_parts(image, parts)
+            plan = plan_stage2(parts, part_model.names, disease_model)
+            case(f"stage2[crops={n}]", lambda crops=crops, plan=plan: run_stage2(crops, plan))
+
+        results_direct = disease_model(image)
+        parts = grid_parts(image, 10)
+        crops = crop_parts(image, parts)
+        crop_results = run_stage2(crops, plan_stage2(parts, part_model.names, disease_model))
+        crop_urls = [""] * len(parts)
+        case("postprocess[direct]", lambda: direct_predictions(results_direct, disease_model.names))
+        case("postprocess[part-first,crops=10]",
+             lambda: part_first_predictions(parts, crop_results, part_model.names, crop_urls))
+        case("annotate[direct]", lambda: annotate_direct(results_direct, disease_model.names))
+        case("annotate[part-first,crops=10]",
+             lambda: annotate_part_first(image.copy(), parts, crops, crop_results, part_model.names,
+                                         os.path.join(tmp_dir, "crops")))
+
+        # The augmentor loads its image from disk and works in RGB
+        source_path = os.path.join(tmp_dir, "source.png")
+        cv2.imwrite(source_path, image)
+        augmentor = LegacyAugmentor(source_path)
+        rgb = augmentor.original
+        case("augment[adjust_color_temperature]", lambda: augmentor.adjust_color_temperature(rgb, 0.5))
+        case("augment[color_jitter]", lambda: augmentor.color_jitter(rgb))
+        case("augment[channel_shift]", lambda: augmentor.channel_shift(rgb))
+        case("augment[add_colored_lighting]",
+             lambda: augmentor.add_colored_lighting(rgb, (255, 0, 255), 0.2))
+        case("augment[generate_variations=8]", lambda: augmentor.generate_variations(8))
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Cases whose median is more than `threshold` (a fraction) slower than the baseline."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_ms"], result["median_ms"]
+        if before > 0 and after > before * (1 + threshold):
+            regressions.append(f"{name}: {before:.2f} ms -> {after:.2f} ms (+{after / before - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per case")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Use a seeded synthetic image instead of the Inastek set")
+    parser.add_argument("--only", help="Run only cases whose name contains this")
+    parser.add_argument("--output", help="Write the results and machine metadata here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store these results as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed slowdown of a case's median over the baseline")
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="Pin torch's thread count for comparable runs (0 = torch default)")
+    args = parser.parse_args()
+
+    if args.torch_threads:
+        import torch
+        torch.set_num_threads(args.torch_threads)
+
+    report = {
+        "metadata": machine_metadata(),
+        "results": run_benchmarks(bench_images(args.synthetic), args.repeat, args.only),
+    }
+    report["metadata"]["repeat"] = args.repeat
+    report["metadata"]["synthetic"] = args.synthetic
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with; record one with --save-baseline", file=sys.stderr)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["metadata"].get("cpu") != report["metadata"]["cpu"]:
+        print(f"Warning: baseline was recorded on {baseline['metadata'].get('cpu')}", file=sys.stderr)
+    regressions = compare(report["results"], baseline["results"], args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
+    print(f"No case slower than the baseline by more than {args.threshold:.0%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""Vectorised colour and lighting augmentation for the strawberry photos.
+
+One pipeline replaces the ImageAugmentor copies of the scripts in this
+directory. Its stages are colour temperature, colour jitter, channel shift,
+coloured (grow) light and HSV gain, and `Augmenter.generate` returns K
+variations of an image as one stacked uint8 array with an AugmentationInfo
+per variation.
+
+Each stage maps every channel value on its own (in RGB, or in HSV for
+jitter and HSV gain), so it only has to update a (K, 3, 256) lookup table
+per variation. Consecutive RGB stages compose into one table, which is
+applied to the image once for the whole stack by broadcasting. HSV stages
+convert only the variations they apply to, all in one cvtColor call. After
+every stage the values are clipped and rounded the way the uint8
+conversions of the old scripts did.
+
+    augmenter = standard_augmenter(seed=0)
+    batch, infos = augmenter.generate(image_rgb, 32)   # (32, H, W, 3) uint8
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Colour lights of augment.py
+YELLOW_PURPLE = {
+    "yellow": {"rgb": (255, 255, 0), "intensity_range": (0.1, 0.3)},
+    "purple": {"rgb": (255, 0, 255), "intensity_range": (0.1, 0.3)},
+}
+
+# Indoor farming lights of lighting_augment.py, temp_light.py and ligaugsave.py
+RED_PURPLE = {
+    "red (630-660nm)": {"rgb": (255, 0, 0), "intensity_range": (0.1, 0.3)},
+    "indoor purple": {"rgb": (127, 0, 255), "intensity_range": (0.1, 0.3)},
+}
+
+# Define optimal grow light colors
+GROW_LIGHT_COLORS = {
+    'deep_red': {
+        'rgb': (255, 0, 0),  # RGB for ~660nm
+        'wavelength': '660nm',
+        'purpose': 'Flowering, fruiting, stem growth',
+        'intensity_range': (0.2, 0.4)
+    },
+    'red': {
+        'rgb': (255, 20, 0),  # RGB for ~630nm
+        'wavelength': '630nm',
+        'purpose': 'Photosynthesis, flowering',
+        'intensity_range': (0.15, 0.35)
+    },
+    'blue': {
+        'rgb': (0, 0, 255),  # RGB for ~450nm
+        'wavelength': '450nm',
+        'purpose': 'Vegetative growth, compactness',
+        'intensity_range': (0.1, 0.25)
+    },
+    'purple_mix': {
+        'rgb': (127, 0, 255),  # Combined red and blue
+        'wavelength': '430-660nm mix',
+        'purpose': 'Full growth cycle',
+        'intensity_range': (0.15, 0.30)
+    },
+    'warm_white': {
+        'rgb': (255, 244, 229),  # Full spectrum
+        'wavelength': '380-700nm',
+        'purpose': 'General purpose, inspection',
+        'intensity_range': (0.1, 0.2)
+    }
+}
+
+# Start of each channel's 256 entries in a flattened (3, 256) table
+_CHANNEL_OFFSETS = np.arange(3) * 256
+# OpenCV's 8-bit HSV ranges, as (3, 1) to broadcast against tables
+_HSV_MAX = np.array([[179], [255], [255]], np.float64)
+
+
+@dataclass
+class AugmentationInfo:
+    """Store information about applied augmentations"""
+    temperature: float = None
+    jitter: Dict[str, float] = None
+    channel_shift: Dict[str, float] = None
+    colored_light: Dict[str, float] = None
+    hsv: Dict[str, float] = None
+
+
+def _identity(k: int) -> np.ndarray:
+    return np.tile(np.arange(256, dtype=np.float64), (k, 3, 1))
+
+
+def _lookup(tables: np.ndarray, images: np.ndarray) -> np.ndarray:
+    """Map every channel value through per-variation tables.
+
+    `tables` is (K, 3, 256); `images` is either one (H, W, 3) image shared by
+    all K variations or a (K, H, W, 3) stack with one image per variation.
+    """
+    flat = tables.astype(np.uint8).reshape(len(tables), 3 * 256)
+    if images.ndim == 3:
+        return flat[:, images + _CHANNEL_OFFSETS]
+    out = np.empty_like(images)
+    for i, image in enumerate(images):
+        np.take(flat[i], image + _CHANNEL_OFFSETS, out=out[i])
+    return out
+
+
+def _per_variation(k: int, chosen: np.ndarray, values: list) -> list:
+    out = [None] * k
+    for i, value in zip(chosen, values):
+        out[i] = value
+    return out
+
+
+class Stage:
+    """An augmentation applied to each variation with probability `p`.
+
+    `apply` samples the parameters of K variations and updates their
+    (K, 3, 256) float tables in place, in the colour space named by `space`.
+    It returns each variation's value for the AugmentationInfo attribute
+    `field`, None where the stage was not applied.
+    """
+    field = ""
+    space = "rgb"
+
+    def __init__(self, p: float = 0.5):
+        self.p = p
+
+    def _choose(self, k: int, rng: np.random.Generator) -> np.ndarray:
+        return np.flatnonzero(rng.random(k) < self.p)
+
+    def apply(self, tables: np.ndarray, rng: np.random.Generator) -> List[Optional[object]]:
+        raise NotImplementedError
+
+
+class ColorTemperature(Stage):
+    """Warmer (more red, less blue) or cooler light, temperature in ±`strength`."""
+    field = "temperature"
+
+    def __init__(self, p: float = 0.5, strength: float = 1.0):
+        super().__init__(p)
+        self.strength = strength
+
+    def apply(self, tables, rng):
+        chosen = self._choose(len(tables), rng)
+        temperature = rng.uniform(-self.strength, self.strength, len(chosen))
+        gain = np.ones((len(chosen), 3, 1))
+        gain[:, 0, 0] = 1 + temperature * 0.1
+        gain[:, 2, 0] = 1 - temperature * 0.1
+        tables[chosen] = np.floor(np.clip(tables[chosen] * gain, 0, 255))
+        return _per_variation(len(tables), chosen, [float(t) for t in temperature])
+
+
+class ColorJitter(Stage):
+    """Hue shifted by up to ±`hue` (OpenCV units, clipped), saturation and value scaled."""
+    field = "jitter"
+    space = "hsv"
+
+    def __init__(self, p: float = 0.5, hue: float = 10.0,
+                 saturation: Tuple[float, float] = (0.5, 1.5), value: Tuple[float, float] = (0.7, 1.3)):
+        super().__init__(p)
+        self.hue = hue
+        self.saturation = saturation
+        self.value = value
+
+    def apply(self, tables, rng):
+        chosen = self._choose(len(tables), rng)
+        n = len(chosen)
+        hue = rng.uniform(-self.hue, self.hue, n)
+        saturation = rng.uniform(*self.saturation, n)
+        value = rng.uniform(*self.value, n)
+        jittered = tables[chosen]
+        jittered[:, 0] += hue[:, None]
+        jittered[:, 1] *= saturation[:, None]
+        jittered[:, 2] *= value[:, None]
+        tables[chosen] = np.floor(np.clip(jittered, 0, _HSV_MAX))
+        return _per_variation(len(tables), chosen, [
+            {'hue': round(float(h), 2), 'saturation': round(float(s), 2), 'value': round(float(v), 2)}
+            for h, s, v in zip(hue, saturation, value)
+        ])
+
+
+class HSVGain(Stage):
+    """Hue rotated by up to ±`h_gain` of the hue circle, saturation and value scaled by
+    up to ±`s_gain` and ±`v_gain` (the `augment_hsv` of hsv.py and hsv2.py)."""
+    field = "hsv"
+    space = "hsv"
+
+    def __init__(self, p: float = 0.5, h_gain: float = 0.015, s_gain: float = 0.7, v_gain: float = 0.4):
+        super().__init__(p)
+        self.h_gain = h_gain
+        self.s_gain = s_gain
+        self.v_gain = v_gain
+
+    def apply(self, tables, rng):
+        chosen = self._choose(len(tables), rng)
+        n = len(chosen)
+        delta_h = rng.uniform(-self.h_gain, self.h_gain, n) * 180
+        factor_s = rng.uniform(1 - self.s_gain, 1 + self.s_gain, n)
+        factor_v = rng.uniform(1 - self.v_gain, 1 + self.v_gain, n)
+        shifted = tables[chosen]
+        shifted[:, 0] = (shifted[:, 0] + delta_h[:, None]) % 180
+        shifted[:, 1] *= factor_s[:, None]
+        shifted[:, 2] *= factor_v[:, None]
+        tables[chosen] = np.floor(np.clip(shifted, 0, 255))
+        return _per_variation(len(tables), chosen, [
+            {'hue': round(float(h), 2), 'saturation': round(float(s), 2), 'value': round(float(v), 2)}
+            for h, s, v in zip(delta_h, factor_s, factor_v)
+        ])
+
+
+class ChannelShift(Stage):
+    """Each RGB channel offset by up to ±`shift`."""
+    field = "channel_shift"
+
+    def __init__(self, p: float = 0.5, shift: float = 30.0):
+        super().__init__(p)
+        self.shift = shift
+
+    def apply(self, tables, rng):
+        chosen = self._choose(len(tables), rng)
+        shifts = rng.uniform(-self.shift, self.shift, (len(chosen), 3))
+        tables[chosen] = np.floor(np.clip(tables[chosen] + shifts[:, :, None], 0, 255))
+        return _per_variation(len(tables), chosen, [
+            {'R': round(float(r), 2), 'G': round(float(g), 2), 'B': round(float(b), 2)}
+            for r, g, b in shifts
+        ])
+
+
+class ColoredLight(Stage):
+    """A coloured light added on top, like cv2.addWeighted(image, 1, colour, intensity, 0).
+
+    `lights` maps a name to {"rgb", "intensity_range"} and optionally
+    "wavelength" and "purpose" (see GROW_LIGHT_COLORS). Each variation gets
+    a random light or, with `cycle`, the lights in turn.
+    """
+    field = "colored_light"
+
+    def __init__(self, lights: Dict[str, Dict] = None, p: float = 0.5, cycle: bool = False):
+        super().__init__(p)
+        self.lights = YELLOW_PURPLE if lights is None else lights
+        self.names = list(self.lights)
+        self.cycle = cycle
+        self._rgb = np.array([self.lights[name]["rgb"] for name in self.names], np.float64)
+        self._ranges = np.array([self.lights[name]["intensity_range"] for name in self.names], np.float64)
+
+    def _info(self, name: str, intensity: float) -> Dict:
+        light = self.lights[name]
+        if "wavelength" not in light:
+            return {'color': name, 'intensity': round(intensity, 2)}
+        return {
+            'color': f"{name.replace('_', ' ').title()} ({light['wavelength']})",
+            'intensity': round(intensity, 2),
+            'purpose': light.get('purpose'),
+        }
+
+    def apply(self, tables, rng):
+        chosen = self._choose(len(tables), rng)
+        if self.cycle:
+            which = chosen % len(self.names)
+        else:
+            which = rng.integers(len(self.names), size=len(chosen))
+        intensity = rng.uniform(self._ranges[which, 0], self._ranges[which, 1])
+        light = self._rgb[which] * intensity[:, None]
+        tables[chosen] = np.clip(np.rint(tables[chosen] + light[:, :, None]), 0, 255)
+        return _per_variation(len(tables), chosen, [
+            self._info(self.names[w], float(i)) for w, i in zip(which, intensity)
+        ])
+
+
+class Augmenter:
+    """Stages applied in order to every variation of an image."""
+
+    def __init__(self, stages: Sequence[Stage], seed: int = None):
+        self.stages = list(stages)
+        self.rng = np.random.default_rng(seed)
+
+    def generate(self, image: np.ndarray, k: int) -> Tuple[np.ndarray, List[AugmentationInfo]]:
+        """`k` variations of an RGB uint8 image as a (k, H, W, 3) array, plus their parameters."""
+        infos = [AugmentationInfo() for _ in range(k)]
+        tables = _identity(k)
+        pending = np.zeros(k, bool)
+        batch = None
+        for stage in self.stages:
+            if stage.space == "rgb":
+                values = stage.apply(tables, self.rng)
+                pending |= np.array([value is not None for value in values], bool)
+            else:
+                hsv_tables = _identity(k)
+                values = stage.apply(hsv_tables, self.rng)
+                chosen = np.array([i for i, value in enumerate(values) if value is not None], np.intp)
+                if len(chosen):
+                    batch = self._flush(image, batch, tables, pending)
+                    tables, pending = _identity(k), np.zeros(k, bool)
+                    selected = batch[chosen]
+                    n, h, w = selected.shape[:3]
+                    # Stacked vertically, the variations convert as a single image
+                    hsv = cv2.cvtColor(selected.reshape(n * h, w, 3), cv2.COLOR_RGB2HSV).reshape(selected.shape)
+                    hsv = _lookup(hsv_tables[chosen], hsv)
+                    batch[chosen] = cv2.cvtColor(hsv.reshape(n * h, w, 3), cv2.COLOR_HSV2RGB).reshape(selected.shape)
+            for info, value in zip(infos, values):
+                if value is not None:
+                    setattr(info, stage.field, value)
+        return self._flush(image, batch, tables, pending), infos
+
+    @staticmethod
+    def _flush(image: np.ndarray, batch: Optional[np.ndarray], tables: np.ndarray,
+               pending: np.ndarray) -> np.ndarray:
+        # The first application builds the stack straight from the original image
+        if batch is None:
+            return _lookup(tables, image)
+        changed = np.flatnonzero(pending)
+        if len(changed):
+            batch[changed] = _lookup(tables[changed], batch[changed])
+        return batch
+
+
+def standard_augmenter(seed: int = None) -> Augmenter:
+    """The pipeline of augment.py: temperature, jitter, channel shift and a yellow or purple light."""
+    return Augmenter([ColorTemperature(), ColorJitter(), ChannelShift(), ColoredLight(YELLOW_PURPLE)], seed)
+
+
+def load_rgb(image_path: str) -> np.ndarray:
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError("Could not load image")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def format_augmentation_title(info: AugmentationInfo) -> str:
+    """Format augmentation information into a title string."""
+    parts = []
+
+    if info.temperature is not None:
+        temp_type = "Warm" if info.temperature > 0 else "Cool"
+        parts.append(f"Temp({temp_type}:{info.temperature:.2f})")
+
+    if info.jitter is not None:
+        parts.append(f"Jitter(H:{info.jitter['hue']},S:{info.jitter['saturation']},V:{info.jitter['value']})")
+
+    if info.hsv is not None:
+        parts.append(f"HSV(H:{info.hsv['hue']},S:{info.hsv['saturation']},V:{info.hsv['value']})")
+
+    if info.channel_shift is not None:
+        parts.append(f"Shift(R:{info.channel_shift['R']},G:{info.channel_shift['G']},B:{info.channel_shift['B']})")
+
+    if info.colored_light is not None:
+        parts.append(f"Light({info.colored_light['color']}:{info.colored_light['intensity']})")
+        if info.colored_light.get('purpose'):
+            parts.append(f"Purpose: {info.colored_light['purpose']}")
+
+    return "\n".join(parts) or "No augmentations applied"
+
+
+class ImageAugmentor:
+    """An RGB photo and the augmenter its variations are drawn from."""
+
+    def __init__(self, image_path: str, augmenter: Augmenter = None):
+        """Initialize with an image path."""
+        self.original_path = image_path
+        self.original = load_rgb(image_path)
+        self.augmenter = augmenter or standard_augmenter()
+
+    def generate_variations(self, num_variations: int = 8) -> List[Tuple[np.ndarray, AugmentationInfo]]:
+        """Generate multiple variations of the image with augmentation info."""
+        batch, infos = self.augmenter.generate(self.original, num_variations)
+        return list(zip(batch, infos))
+
+    def format_augmentation_title(self, info: AugmentationInfo) -> str:
+        return format_augmentation_title(info)
+
+    def display_variations(self, variations: List[Tuple[np.ndarray, AugmentationInfo]],
+                           title: str = 'Original Image and Augmented Variations'):
+        """Display original image and its variations in a grid with detailed titles."""
+        from matplotlib import pyplot as plt
+
+        n = len(variations) + 1
+        grid_size = int(np.ceil(np.sqrt(n)))
+        fig, axes = plt.subplots(grid_size, grid_size, figsize=(20, 20), squeeze=False)
+        fig.suptitle(title, fontsize=16)
+
+        # Display original
+        axes[0, 0].imshow(self.original)
+        axes[0, 0].set_title('Original', fontsize=8)
+        axes[0, 0].axis('off')
+
+        # Display variations
+        for idx, (img, info) in enumerate(variations, 1):
+            row = idx // grid_size
+            col = idx % grid_size
+            axes[row, col].imshow(img)
+            axes[row, col].set_title(self.format_augmentation_title(info), fontsize=8, pad=3)
+            axes[row, col].axis('off')
+
+        # Turn off empty subplots
+        for idx in range(len(variations) + 1, grid_size * grid_size):
+            row = idx // grid_size
+            col = idx % grid_size
+            axes[row, col].axis('off')
+
+        plt.tight_layout()
+        plt.show()
+
+    def process_and_display(self, num_variations: int = 8,
+                            title: str = 'Original Image and Augmented Variations'):
+        """Generate and display variations."""
+        self.display_variations(self.generate_variations(num_variations), title)
+
+    def process_and_save(self, num_variations: int = 8, output_dir: str = "augmented_images"):
+        """Generate the variations and save them as `<image name>_aug_<i>.jpg` in `output_dir`."""
+        os.makedirs(output_dir, exist_ok=True)
+        base_filename = os.path.splitext(os.path.basename(self.original_path))[0]
+        variations = self.generate_variations(num_variations)
+        for i, (img, _) in enumerate(variations):
+            filepath = os.path.join(output_dir, f"{base_filename}_aug_{i}.jpg")
+            cv2.imwrite(filepath, cv2.cvtColor(img, cv2.COLOR_RGB2BGR))
+        print(f"Saved {len(variations)} augmented images to '{output_dir}'")
@@ -0,0 +1,54 @@
+"""Where an evaluation run writes its outputs, and reading them back.
+
+Only the standard library is needed here, so the outputs can be scored
+without the models (or torch) being installed.
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+WEBAPP_DIR = os.path.join(SCRIPT_DIR, "..", "..", "WebApp")
+
+partModelPaths = {
+    "strawberry_part_detection": os.path.join(WEBAPP_DIR, "models", "strawberry_part_detection.pt"),
+    "strawberry_tuned": os.path.join(WEBAPP_DIR, "models", "strawberry_tuned.pt"),
+}
+
+diseaseModelPaths = {
+    "leafblight": os.path.join(WEBAPP_DIR, "models", "leafblight.pt"),
+    "best_strawberry_disease_model": os.path.join(WEBAPP_DIR, "models", "best_strawberry_disease_model.pt"),
+}
+
+# (detection method, part model name, disease model name); part model is "" in direct mode
+Combination = Tuple[str, str, str]
+
+
+def output_prefix(output_folder: str, image_path: str, part_name: str, disease_name: str) -> str:
+    """Common path prefix of one combination's annotated image and predictions."""
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(output_folder, f"{base_name}_{part_name}_{disease_name}")
+
+
+def inastek_output_folder(disease: str, image_path: str) -> str:
+    """`<dataset>/<disease>_output/<image name>`, where an Inastek image's outputs go."""
+    inastek_folder = os.path.dirname(os.path.dirname(image_path))
+    image_name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(inastek_folder, f"{disease}_output", image_name)
+
+
+def combinations(part_names: Iterable[str], disease_names: Iterable[str]) -> List[Combination]:
+    """Every combination in evaluation order: part-first pairs, then direct mode."""
+    disease_names = list(disease_names)
+    combos = [("part-first", part_name, disease_name)
+              for part_name in part_names
+              for disease_name in disease_names]
+    combos += [("direct", "", disease_name) for disease_name in disease_names]
+    return combos
+
+
+def read_predictions(image_path: str, output_folder: str, combo: Combination) -> List[Dict]:
+    """Load the predictions one combination wrote for an image."""
+    _, part_name, disease_name = combo
+    with open(f"{output_prefix(output_folder, image_path, part_name, disease_name)}_predictions.json") as f:
+        return json.load(f)["predictions"]
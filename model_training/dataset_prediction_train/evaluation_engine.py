@@ -0,0 +1,158 @@
+"""Evaluate every part/disease model combination on an image, sharing stage 1.
+
+Every model is loaded once. Each part model runs once per image and its
+crops are fanned out to every disease model, so a full matrix costs one
+stage-1 pass per part model instead of one per combination.
+"""
+import json
+import multiprocessing
+import os
+import sys
+from typing import Dict, Iterator, List, Tuple
+
+import cv2
+
+from eval_outputs import WEBAPP_DIR, Combination, combinations, output_prefix
+
+sys.path.insert(0, WEBAPP_DIR)
+
+from inference.config import CONF_THRESH
+from inference.predict import (annotate_direct, annotate_part_first, crop_parts,
+                               detect_crop_diseases, detect_parts, keep_confident)
+from inference.registry import ModelRegistry
+
+import raw_store
+
+
+def outputs_exist(image_path: str, output_folder: str, combos: List[Combination],
+                  raw_store_dir: str = None) -> bool:
+    """Whether every combination's predictions JSON (and the raw shard) exist for this image."""
+    if raw_store_dir and not os.path.exists(raw_store.shard_path(raw_store_dir, image_path)):
+        return False
+    return all(os.path.exists(f"{output_prefix(output_folder, image_path, part, disease)}_predictions.json")
+               for _, part, disease in combos)
+
+
+class MatrixEvaluator:
+    """Run the model matrix over single images.
+
+    With a `raw_store_dir`, the models run down to `raw_store.RAW_CONF_FLOOR`
+    and every unthresholded detection is stored for offline threshold
+    sweeps; the regular outputs are then filtered to `conf_thresh` and stay
+    the same as without the store.
+    """
+
+    def __init__(self, part_model_paths: Dict[str, str], disease_model_paths: Dict[str, str],
+                 conf_thresh: float = CONF_THRESH, raw_store_dir: str = None):
+        # Images are processed one at a time here, so there is nothing to micro-batch
+        registry = ModelRegistry({**part_model_paths, **disease_model_paths}, batch_window_ms=0)
+        self.part_models = {name: registry.get(name) for name in part_model_paths}
+        self.disease_models = {name: registry.get(name) for name in disease_model_paths}
+        self.conf_thresh = conf_thresh
+        self.raw_store_dir = raw_store_dir
+        self.run_conf = conf_thresh
+        if raw_store_dir:
+            self.run_conf = min(conf_thresh, raw_store.RAW_CONF_FLOOR)
+            names = {name: handle.names for name, handle in
+                     {**self.part_models, **self.disease_models}.items()}
+            raw_store.write_index(raw_store_dir, self.combinations(), names, self.run_conf)
+
+    def combinations(self) -> List[Combination]:
+        return combinations(self.part_models, self.disease_models)
+
+    def evaluate(self, image_path: str, output_folder: str) -> Dict[Combination, List[Dict]]:
+        """Write the annotated image, crops and predictions JSON of every combination."""
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Failed to load image: {image_path}")
+        os.makedirs(output_folder, exist_ok=True)
+        combo_index = {combo: i for i, combo in enumerate(self.combinations())}
+        results = {}
+        raw_rows = []
+
+        for part_name, part_model in self.part_models.items():
+            all_parts = detect_parts(part_model, image, self.run_conf)
+            all_crops = crop_parts(image, all_parts)
+            # Identical to running stage 1 at conf_thresh: NMS never lets a weaker box suppress a stronger one
+            keep = [i for i, part in enumerate(all_parts) if part["confidence"] >= self.conf_thresh]
+            parts = [all_parts[i] for i in keep]
+            crops = [all_crops[i] for i in keep]
+            for disease_name, disease_model in self.disease_models.items():
+                combo = ("part-first", part_name, disease_name)
+                if self.raw_store_dir:
+                    all_results = detect_crop_diseases(disease_model, all_crops, self.run_conf)
+                    raw_rows += raw_store.part_first_rows(combo_index[combo], all_parts, all_results)
+                    crop_results = [keep_confident(all_results[i], self.conf_thresh) for i in keep]
+                else:
+                    crop_results = detect_crop_diseases(disease_model, crops, self.conf_thresh)
+                annotated = image.copy()
+                predictions = annotate_part_first(
+                    annotated, parts, crops, crop_results, part_model.names,
+                    os.path.join(output_folder, f"crops_{part_name}_{disease_name}"), self.conf_thresh,
+                )
+                self._save(output_folder, image_path, part_name, disease_name, annotated, predictions)
+                results[combo] = predictions
+
+        for disease_name, disease_model in self.disease_models.items():
+            combo = ("direct", "", disease_name)
+            direct_results = disease_model(image, conf=self.run_conf)
+            if self.raw_store_dir:
+                raw_rows += raw_store.direct_rows(combo_index[combo], direct_results)
+                direct_results = [keep_confident(result, self.conf_thresh) for result in direct_results]
+            annotated, predictions = annotate_direct(direct_results, disease_model.names, self.conf_thresh)
+            self._save(output_folder, image_path, "", disease_name, annotated, predictions)
+            results[combo] = predictions
+
+        if self.raw_store_dir:
+            raw_store.write_shard(self.raw_store_dir, image_path, raw_rows)
+        return results
+
+    def _save(self, output_folder, image_path, part_name, disease_name, annotated, predictions):
+        prefix = output_prefix(output_folder, image_path, part_name, disease_name)
+        cv2.imwrite(f"{prefix}_annotated.jpg", annotated)
+        # Written last and atomically: its presence marks the combination as done
+        tmp_path = f"{prefix}_predictions.json.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"success": True, "predictions": predictions}, f)
+        os.replace(tmp_path, f"{prefix}_predictions.json")
+
+
+# One evaluator per worker process, built by _init_worker
+_evaluator = None
+
+
+def _init_worker(part_model_paths, disease_model_paths, conf_thresh, torch_threads, raw_store_dir):
+    global _evaluator
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+    _evaluator = MatrixEvaluator(part_model_paths, disease_model_paths, conf_thresh, raw_store_dir)
+
+
+def _evaluate_task(task: Tuple[str, str]) -> Tuple[str, Dict]:
+    image_path, output_folder = task
+    try:
+        return image_path, {"results": _evaluator.evaluate(image_path, output_folder)}
+    except Exception as e:
+        return image_path, {"error": str(e)}
+
+
+def evaluate_many(tasks: List[Tuple[str, str]], part_model_paths: Dict[str, str],
+                  disease_model_paths: Dict[str, str], workers: int = 1, torch_threads: int = 0,
+                  conf_thresh: float = CONF_THRESH,
+                  raw_store_dir: str = None) -> Iterator[Tuple[str, Dict]]:
+    """Evaluate (image path, output folder) tasks, sharded over `workers` processes.
+
+    Every worker loads its own copy of the models once. Results are yielded in
+    task order whatever the worker count, as `{"results": ...}` or `{"error": ...}`.
+    """
+    init_args = (part_model_paths, disease_model_paths, conf_thresh, torch_threads, raw_store_dir)
+    if workers <= 1:
+        _init_worker(*init_args)
+        yield from map(_evaluate_task, tasks)
+        return
+
+    # spawn rather than fork: torch's thread pools do not survive a fork reliably
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=init_args) as pool:
+        yield from pool.imap(_evaluate_task, tasks)
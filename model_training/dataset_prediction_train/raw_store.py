@@ -0,0 +1,146 @@
+"""Columnar store of unthresholded detections from an evaluation run.
+
+One `.npz` shard per image (`<store>/<disease>/<image name>.npz`) holds
+every detection at or above `RAW_CONF_FLOOR` for every model combination,
+as parallel columns:
+
+- `combo`: index into the combinations listed in `index.json`
+- `stage`: 0 for a stage-1 part box, 1 for a disease box
+- `parent`: row of the part a part-first disease box was found in, else -1
+- `cls`, `conf`: class id and confidence
+- `bbox`: x1, y1, x2, y2 (disease boxes of part-first mode are crop-relative)
+
+`index.json` records the combinations, the class names of every model and
+the confidence floor, so the store can be scored without loading a model.
+"""
+import json
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Lowest threshold a sweep can evaluate; detections below it are not stored
+RAW_CONF_FLOOR = 0.01
+
+STAGE_PART = 0
+STAGE_DISEASE = 1
+
+COLUMNS = ("combo", "stage", "parent", "cls", "conf", "bbox")
+
+
+def shard_path(store: str, image_path: str) -> str:
+    disease = os.path.basename(os.path.dirname(image_path))
+    image_name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(store, disease, f"{image_name}.npz")
+
+
+def write_index(store: str, combos: List, names: Dict[str, Dict[int, str]],
+                conf_floor: float = RAW_CONF_FLOOR) -> None:
+    os.makedirs(store, exist_ok=True)
+    index = {
+        "combinations": [list(combo) for combo in combos],
+        "names": {model: {str(k): v for k, v in model_names.items()} for model, model_names in names.items()},
+        "conf_floor": conf_floor,
+    }
+    # Every worker writes the same index; the rename keeps readers from seeing half of it
+    tmp_path = os.path.join(store, f"index.json.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, os.path.join(store, "index.json"))
+
+
+def read_index(store: str) -> Dict:
+    with open(os.path.join(store, "index.json")) as f:
+        index = json.load(f)
+    index["combinations"] = [tuple(combo) for combo in index["combinations"]]
+    index["names"] = {model: {int(k): v for k, v in model_names.items()}
+                      for model, model_names in index["names"].items()}
+    return index
+
+
+def _rows(combo: int, stage: int, parent, data: np.ndarray) -> Dict[str, np.ndarray]:
+    n = len(data)
+    return {
+        "combo": np.full(n, combo, dtype=np.int16),
+        "stage": np.full(n, stage, dtype=np.int8),
+        "parent": np.broadcast_to(np.asarray(parent, dtype=np.int32), (n,)).copy(),
+        "cls": data[:, 5].astype(np.int16),
+        "conf": data[:, 4].astype(np.float32),
+        "bbox": data[:, :4].astype(np.float32),
+    }
+
+
+def _boxes(result) -> np.ndarray:
+    data = result.boxes.data.cpu().numpy()  # x1, y1, x2, y2, [track id,] conf, cls
+    return np.concatenate([data[:, :4], data[:, -2:]], axis=1)
+
+
+def part_first_rows(combo: int, parts: List[Dict], crop_results: list) -> List[Dict[str, np.ndarray]]:
+    """Rows of the part boxes followed by the disease boxes found in each part's crop."""
+    part_data = np.array([part["bbox"] + [part["confidence"], part["class_id"]] for part in parts],
+                         dtype=np.float32).reshape(-1, 6)
+    rows = [_rows(combo, STAGE_PART, -1, part_data)]
+    rows += [_rows(combo, STAGE_DISEASE, i, _boxes(result)) for i, result in enumerate(crop_results)]
+    return rows
+
+
+def direct_rows(combo: int, results: list) -> List[Dict[str, np.ndarray]]:
+    return [_rows(combo, STAGE_DISEASE, -1, _boxes(result)) for result in results]
+
+
+def write_shard(store: str, image_path: str, rows: List[Dict[str, np.ndarray]]) -> None:
+    """Concatenate per-combination rows into one shard; `parent` becomes shard-relative."""
+    columns = {column: [] for column in COLUMNS}
+    offset = part_offset = 0
+    for block in rows:
+        if block["stage"].size and block["stage"][0] == STAGE_PART:
+            part_offset = offset
+        parent = block["parent"]
+        columns["parent"].append(np.where(parent >= 0, parent + part_offset, -1) if parent.size else parent)
+        for column in COLUMNS:
+            if column != "parent":
+                columns[column].append(block[column])
+        offset += len(parent)
+
+    path = shard_path(store, image_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    arrays = {column: np.concatenate(values) if values else np.empty(0)
+              for column, values in columns.items()}
+    arrays["bbox"] = arrays["bbox"].reshape(-1, 4)
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_store(store: str) -> Tuple[Dict[str, np.ndarray], List[Tuple[str, str]]]:
+    """All shards as one set of columns plus the (disease, image name) of every shard.
+
+    The extra `image` column is each row's position in that list, and
+    `parent` is made relative to the combined columns.
+
+    Shards are read in sorted order so repeated loads give identical arrays.
+    """
+    columns = {column: [] for column in COLUMNS}
+    columns["image"] = []
+    images = []
+    for disease in sorted(os.listdir(store)):
+        folder = os.path.join(store, disease)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith(".npz") or name.endswith(".tmp.npz"):
+                continue
+            with np.load(os.path.join(folder, name)) as shard:
+                offset = sum(len(c) for c in columns["combo"])
+                parent = shard["parent"]
+                columns["parent"].append(np.where(parent >= 0, parent + offset, -1))
+                for column in COLUMNS:
+                    if column != "parent":
+                        columns[column].append(shard[column])
+                columns["image"].append(np.full(len(parent), len(images), dtype=np.int32))
+            images.append((disease, os.path.splitext(name)[0]))
+
+    arrays = {column: np.concatenate(values) if values else np.empty(0)
+              for column, values in columns.items()}
+    arrays["bbox"] = arrays["bbox"].reshape(-1, 4)
+    return arrays, images
@@ -0,0 +1,158 @@
+"""Generate the Inastek evaluation table from the predictions JSON of an evaluation run.
+
+Produces the same layout as the hand-filled
+`Evaluasi_Deteksi_Penyakit_Strawberry_Berdasarkan_Dataset_Inastek - Sheet1.csv`:
+one 0/1 row per image, then "Total Berhasil", "Total Berhasil Per" and
+"Percentage Berhasil" per disease folder, and overall totals at the bottom.
+An image counts as a success when a detection names its disease folder.
+
+    python score_inastek.py
+
+`predict_inastek_dataset.py` keeps the table up to date while it runs.
+"""
+import csv
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from eval_outputs import WEBAPP_DIR, Combination, inastek_output_folder, read_predictions
+
+sys.path.insert(0, WEBAPP_DIR)
+
+from inference.config import INASTEK_DIR
+from inference.dataset import inastek_images, is_detected
+
+SCORE_CSV = os.path.join(
+    INASTEK_DIR, "Evaluasi_Deteksi_Penyakit_Strawberry_Berdasarkan_Dataset_Inastek - Generated.csv")
+
+# Column labels used in the spreadsheet
+MODEL_LABELS = {
+    "strawberry_part_detection": "Strawberry Part Detection (strawberry_part_detection)",
+    "strawberry_tuned": "Strawberry Part Detection v2 (strawberry_tuned)",
+    "best_strawberry_disease_model": "Best 7 Diseases Detection (best_strawberry_diseases)",
+    "leafblight": "7 Diseases + Leaf Blight Detection (leafblight)",
+}
+
+
+def _label(name: str) -> str:
+    return MODEL_LABELS.get(name, name)
+
+
+def _column_order(combo: Combination) -> Tuple[bool, int, int]:
+    """Direct before part-first, then parts and diseases in MODEL_LABELS order."""
+    rank = {name: i for i, name in enumerate(MODEL_LABELS)}
+    method, part_name, disease_name = combo
+    return method != "direct", rank.get(part_name, len(rank)), rank.get(disease_name, len(rank))
+
+
+def _percentage(hits: int, total: int) -> str:
+    return f"{100 * hits / total:.2f}%" if total else ""
+
+
+class Scoreboard:
+    """Per-image success of every combination, written out as the evaluation table.
+
+    Images that have not been evaluated yet are left blank and do not count
+    towards "Total Berhasil Per", so the table is meaningful mid-run.
+    """
+
+    def __init__(self, combos: List[Combination], images: List[Tuple[str, str]] = None,
+                 csv_path: str = SCORE_CSV):
+        # Same column order as the hand-filled spreadsheet
+        self.combos = sorted(combos, key=_column_order)
+        self.images = inastek_images() if images is None else images
+        self.csv_path = csv_path
+        self._disease_of = {image_path: disease for disease, image_path in self.images}
+        self._outcomes: Dict[str, Dict[Combination, bool]] = {}
+
+    def record(self, image_path: str, results: Dict[Combination, List[Dict]]) -> None:
+        disease = self._disease_of[image_path]
+        self._outcomes[image_path] = {combo: is_detected(predictions, disease)
+                                      for combo, predictions in results.items()}
+
+    def load_existing(self) -> None:
+        """Score every image whose predictions were already written by an earlier run."""
+        for disease, image_path in self.images:
+            output_folder = inastek_output_folder(disease, image_path)
+            results = {}
+            for combo in self.combos:
+                try:
+                    results[combo] = read_predictions(image_path, output_folder, combo)
+                except (OSError, ValueError, KeyError):
+                    continue
+            if results:
+                self.record(image_path, results)
+
+    def _outcome(self, image_path: str, combo: Combination) -> Optional[bool]:
+        return self._outcomes.get(image_path, {}).get(combo)
+
+    def _header(self) -> List[List[str]]:
+        direct = [combo for combo in self.combos if combo[0] == "direct"]
+        part_first = [combo for combo in self.combos if combo[0] != "direct"]
+        width = 2 + 2 * len(self.combos)
+
+        methods = ["", "", "Direct"] + [""] * (len(direct) - 1) + ["Part First"]
+        part_labels = ["Diseases", ""] + [""] * len(direct)
+        previous_part = None
+        for _, part_name, _ in part_first:
+            part_labels.append(_label(part_name) if part_name != previous_part else "")
+            previous_part = part_name
+        part_labels.append("Total Image")
+        disease_labels = ["", ""] + [_label(disease_name) for _, _, disease_name in self.combos]
+        return [row + [""] * (width - len(row)) for row in (methods, part_labels, disease_labels)]
+
+    def rows(self) -> List[List[str]]:
+        n = len(self.combos)
+        table = self._header()
+        overall_hits, overall_done, overall_total = [0] * n, [0] * n, 0
+
+        by_disease: Dict[str, List[str]] = {}
+        for disease, image_path in self.images:
+            by_disease.setdefault(disease, []).append(image_path)
+
+        for disease, image_paths in by_disease.items():
+            hits, done = [0] * n, [0] * n
+            for i, image_path in enumerate(image_paths):
+                cells = []
+                for j, combo in enumerate(self.combos):
+                    outcome = self._outcome(image_path, combo)
+                    if outcome is None:
+                        cells.append("")
+                        continue
+                    hits[j] += outcome
+                    done[j] += 1
+                    cells.append(str(int(outcome)))
+                totals = [str(len(image_paths))] * n if i == 0 else [""] * n
+                table.append([disease if i == 0 else "", ""] + cells + totals)
+
+            table.append(["Total Berhasil", ""] + [str(h) for h in hits] + [""] * n)
+            table.append(["Total Berhasil Per", ""] + [f"{h} / {d}" for h, d in zip(hits, done)] + [""] * n)
+            table.append(["Percentage Berhasil", ""] + [_percentage(h, d) for h, d in zip(hits, done)] + [""] * n)
+            table.append([""] * (2 + 2 * n))
+
+            overall_hits = [a + b for a, b in zip(overall_hits, hits)]
+            overall_done = [a + b for a, b in zip(overall_done, done)]
+            overall_total += len(image_paths)
+
+        table.append(["Total Berhasil Keseluruhan", ""] + [str(h) for h in overall_hits]
+                     + [str(overall_total)] * n)
+        table.append(["Total Per Keseluruhan", ""]
+                     + [f"{h} / {d}" for h, d in zip(overall_hits, overall_done)] + [""] * n)
+        table.append(["Percentage Keseluruhan", ""]
+                     + [_percentage(h, d) for h, d in zip(overall_hits, overall_done)] + [""] * n)
+        return table
+
+    def write(self) -> None:
+        tmp_path = self.csv_path + ".tmp"
+        with open(tmp_path, "w", newline="") as f:
+            csv.writer(f).writerows(self.rows())
+        os.replace(tmp_path, self.csv_path)
+
+
+if __name__ == "__main__":
+    from eval_outputs import combinations, diseaseModelPaths, partModelPaths
+
+    scoreboard = Scoreboard(combinations(partModelPaths, diseaseModelPaths))
+    scoreboard.load_existing()
+    scoreboard.write()
+    print(scoreboard.csv_path)
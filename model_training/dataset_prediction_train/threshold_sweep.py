@@ -0,0 +1,133 @@
+"""Score a raw-prediction store over a grid of confidence thresholds, without inference.
+
+    python predict_inastek_dataset.py --raw-store ../test_dataset_inastek/raw_predictions
+    python threshold_sweep.py ../test_dataset_inastek/raw_predictions --thresholds 0.05 0.1 0.25 0.5
+
+For every combination and threshold this reports the Inastek success rate
+(an image succeeds when a detection names its disease folder) and
+per-class precision / recall, plus the mAP over the ranking of confidences.
+The Inastek set only labels whole images, so precision, recall and AP are
+image-level: a class counts as predicted for an image when any of its
+boxes clears the threshold. In part-first mode a disease box only clears
+the threshold when the part it was found in does too.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "..", "..", "WebApp"))
+
+from inference.dataset import normalise_label
+
+from raw_store import STAGE_DISEASE, load_store, read_index
+
+DEFAULT_THRESHOLDS = np.round(np.arange(0.05, 0.95, 0.05), 2)
+
+
+def image_scores(columns: Dict[str, np.ndarray], combo: int, n_images: int, n_classes: int) -> np.ndarray:
+    """(images, classes) matrix of the highest effective confidence of each class.
+
+    A part-first disease box survives a threshold only if its part does, so
+    its effective confidence is the lower of the two.
+    """
+    rows = (columns["combo"] == combo) & (columns["stage"] == STAGE_DISEASE)
+    score = columns["conf"][rows]
+    parent = columns["parent"][rows]
+    has_parent = parent >= 0
+    score[has_parent] = np.minimum(score[has_parent], columns["conf"][parent[has_parent]])
+
+    scores = np.zeros((n_images, n_classes), dtype=np.float32)
+    np.maximum.at(scores, (columns["image"][rows], columns["cls"][rows].astype(np.intp)), score)
+    return scores
+
+
+def average_precision(scores: np.ndarray, positives: np.ndarray) -> float:
+    """Non-interpolated AP of ranking images by `scores`; unscored images are never retrieved."""
+    if not positives.any():
+        return float("nan")
+    order = np.argsort(-scores, kind="stable")
+    retrieved = positives[order][scores[order] > 0]
+    precision = np.cumsum(retrieved) / np.arange(1, len(retrieved) + 1)
+    return float((precision * retrieved).sum() / positives.sum())
+
+
+def sweep_combo(scores: np.ndarray, truth: np.ndarray, thresholds: np.ndarray,
+                class_names: List[str], diseases: List[str], image_diseases: np.ndarray) -> Dict:
+    predicted = scores[None] >= thresholds[:, None, None]  # (thresholds, images, classes)
+    tp = (predicted & truth).sum(axis=1)
+    fp = (predicted & ~truth).sum(axis=1)
+    fn = (~predicted & truth).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = tp / (tp + fp)
+        recall = tp / (tp + fn)
+
+    success = (predicted & truth).any(axis=2)  # (thresholds, images)
+    per_disease = {disease: success[:, image_diseases == i].mean(axis=1)
+                   for i, disease in enumerate(diseases)}
+    ap = [average_precision(scores[:, c], truth[:, c]) for c in range(len(class_names))]
+
+    def clean(values):
+        return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+    return {
+        "mAP": None if np.all(np.isnan(ap)) else round(float(np.nanmean(ap)), 4),
+        "AP": dict(zip(class_names, clean(ap))),
+        "thresholds": [{
+            "threshold": round(float(t), 4),
+            "success_rate": round(float(success[k].mean()), 4),
+            "success_per_disease": {d: round(float(rates[k]), 4) for d, rates in per_disease.items()},
+            "precision": dict(zip(class_names, clean(precision[k]))),
+            "recall": dict(zip(class_names, clean(recall[k]))),
+        } for k, t in enumerate(thresholds)],
+    }
+
+
+def sweep(store: str, thresholds: np.ndarray = DEFAULT_THRESHOLDS) -> Dict:
+    index = read_index(store)
+    below_floor = thresholds < index["conf_floor"]
+    if below_floor.any():
+        raise ValueError(f"Thresholds below the store's floor of {index['conf_floor']}: "
+                         f"{thresholds[below_floor].tolist()}")
+    columns, images = load_store(store)
+    diseases = sorted({disease for disease, _ in images})
+    image_diseases = np.array([diseases.index(disease) for disease, _ in images])
+    folder_labels = np.array([normalise_label(disease) for disease, _ in images])
+
+    report = {"images": len(images), "combinations": {}}
+    for combo_id, (method, part_name, disease_name) in enumerate(index["combinations"]):
+        names = index["names"][disease_name]
+        class_names = [names[c] for c in range(len(names))]
+        truth = folder_labels[:, None] == np.array([normalise_label(n) for n in class_names])[None]
+        scores = image_scores(columns, combo_id, len(images), len(class_names))
+        key = f"{method}:{part_name}:{disease_name}" if part_name else f"{method}:{disease_name}"
+        report["combinations"][key] = sweep_combo(scores, truth, thresholds, class_names,
+                                                  diseases, image_diseases)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("store", help="Directory written by predict_inastek_dataset.py --raw-store")
+    parser.add_argument("--thresholds", type=float, nargs="*", default=DEFAULT_THRESHOLDS.tolist())
+    parser.add_argument("--json", help="Write the full report (per class and per disease) here")
+    args = parser.parse_args()
+
+    report = sweep(args.store, np.array(sorted(args.thresholds), dtype=np.float32))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{report['images']} images")
+    for key, combo in report["combinations"].items():
+        print(f"\n{key}  mAP={combo['mAP']}")
+        for row in combo["thresholds"]:
+            precision = [v for v in row["precision"].values() if v is not None]
+            recall = [v for v in row["recall"].values() if v is not None]
+            print(f"  conf>={row['threshold']:.2f}  success={row['success_rate']:.2%}  "
+                  f"precision={np.mean(precision) if precision else 0:.3f}  "
+                  f"recall={np.mean(recall) if recall else 0:.3f}")